@@ -0,0 +1,70 @@
+import collections
+
+from cv_core.database import CardvaultDB
+from cv_core.util import CoreConfig
+
+
+class CardCache:
+    """
+    Bounded cache of card objects shared by the card lists of the engine.
+    A card on several lists is only loaded once and all lists hold the same object. When the cache is full the least
+    recently used cards are dropped.
+    """
+    def __init__(self, database: CardvaultDB, max_size: int = None):
+        """
+        :param database: Database to load missing cards from
+        :param max_size: (Optional) maximum number of cached cards, defaults to CoreConfig.card_cache_size
+        """
+        self.database = database
+        self.max_size = max_size or CoreConfig.card_cache_size
+        self.cards = collections.OrderedDict()
+
+    def get_many(self, card_ids) -> list:
+        """
+        Return the cards for multiverse ids, missing cards are loaded with a single database call
+        :param card_ids: Iterable of multiverse ids
+        :return: List of cv_core.models.Card objects in the order of the ids. Unknown ids are skipped.
+        """
+        card_ids = list(card_ids)
+        missing = [card_id for card_id in card_ids if card_id not in self.cards]
+        if missing:
+            for card in self.database.card_load_many(missing, details=False):
+                self.cards[card.multiverse_id] = card
+        cards = []
+        for card_id in card_ids:
+            card = self.cards.get(card_id)
+            if card:
+                self.cards.move_to_end(card_id)
+                cards.append(card)
+        self.trim(len(cards))
+        return cards
+
+    def add_many(self, cards) -> list:
+        """
+        Add cards loaded by the caller, e.g. with a single query for a whole list
+        :param cards: Iterable of cv_core.models.Card objects
+        :return: List of the cached objects in the order of the given cards. Cards that are already cached are
+        replaced by the cached objects.
+        """
+        shared = []
+        for card in cards:
+            card = self.cards.setdefault(card.multiverse_id, card)
+            self.cards.move_to_end(card.multiverse_id)
+            shared.append(card)
+        self.trim(len(shared))
+        return shared
+
+    def trim(self, keep: int):
+        """
+        Drop the least recently used cards if the cache is full
+        :param keep: Number of most recently used cards that are never dropped, e.g. the ones just requested
+        """
+        while len(self.cards) > max(self.max_size, keep):
+            self.cards.popitem(last=False)
+
+    def clear(self):
+        """ Remove all cards, e.g. after the card data changed """
+        self.cards.clear()
+
+    def __len__(self):
+        return len(self.cards)
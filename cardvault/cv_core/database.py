@@ -1,16 +1,45 @@
 import sqlite3
 import ast
+import collections
+import time
 
 from cv_core.models import Card, Set
-from cv_core.util import MTGConstants
+from cv_core.query import CardQuery
+from cv_core.util import CoreConfig, MTGConstants
 
 
 class CardvaultDB:
     """Data access class for sqlite3"""
+    # Tables holding card resource data
+    card_tables = ('cards', 'cards_fts', 'card_colors', 'card_foreign_names', 'card_legalities', 'card_names',
+                   'card_printings', 'card_rulings', 'card_subtypes', 'card_supertypes', 'card_types',
+                   'card_variations')
+    # Secondary indexes as (table, column) pairs
+    indexes = (('cards', 'multiverseid'), ('cards', 'name'), ('cards', 'set'), ('card_colors', 'multiverseid'),
+               ('card_foreign_names', 'multiverseid'), ('card_legalities', 'multiverseid'),
+               ('card_names', 'multiverseid'), ('card_printings', 'multiverseid'), ('card_rulings', 'multiverseid'),
+               ('card_subtypes', 'multiverseid'), ('card_supertypes', 'multiverseid'), ('card_types', 'multiverseid'),
+               ('card_variations', 'multiverseid'), ('tags', 'tag'), ('tags', 'multiverseid'), ('wants', 'listName'))
+    # Version of the database schema, stored in the user_version pragma of the database file
+    schema_version = 2
+    # Relative bm25 weights of the full text columns (multiverseid, name, text, original_text, flavor, type)
+    fts_weights = (0.0, 10.0, 1.0, 0.5, 0.5, 2.0)
+    # Maximum number of ids bound in a single 'IN (...)' query
+    max_query_params = 500
+    # Connection settings used while rebuilding the card data
+    rebuild_pragmas = {'journal_mode': 'WAL', 'synchronous': 'OFF', 'cache_size': -262144, 'temp_store': 'MEMORY'}
+    # Side tables holding list attributes of cards as (table, value column) pairs
+    list_attribute_tables = (('card_names', 'name'), ('card_types', 'type'), ('card_subtypes', 'subtype'),
+                             ('card_supertypes', 'supertype'), ('card_printings', 'code'),
+                             ('card_variations', 'variation'), ('card_colors', 'color'))
+    # Separator of list attribute values aggregated with group_concat (ASCII unit separator)
+    list_separator = '\x1f'
 
     def __init__(self, db_file: str):
         self.db_file = db_file
         self.connection = sqlite3.connect(self.db_file)
+        # Bound once and shared by all cards loaded without details, see cv_core.models.Card
+        self.details_loader = self.card_load_details
         self.db_create()
 
     # Database operations ##############################################################################################
@@ -20,63 +49,112 @@ class CardvaultDB:
         con = sqlite3.connect(self.db_file)
 
         with con:
-            # Create library table
-            con.execute('CREATE TABLE IF NOT EXISTS cards ('
-                        'multiverseid INT, name TEXT, layout TEXT, manaCost TEXT, fcolor TEXT, cmc INT, '
-                        'rarity TEXT, text TEXT, flavor TEXT, artist TEXT, number INTEGER, power TEXT, '
-                        'toughness TEXT, loyalty INT, watermark TEXT, border TEXT, timeshifted INT, '
-                        'hand TEXT, life TEXT, releaseDate TEXT, starter TEXT, originalText TEXT, originalType TEXT, '
-                        'source TEXT, imageUrl TEXT, `set` TEXT, setName TEXT, id TEXT)')
-
             con.execute("CREATE TABLE IF NOT EXISTS library ( multiverseid INT PRIMARY KEY, copies INT )")
             con.execute("CREATE TABLE IF NOT EXISTS tags ( tag TEXT, multiverseid INT )")
             con.execute("CREATE TABLE IF NOT EXISTS wants ( listName TEXT, multiverseid INT )")
             con.execute("CREATE TABLE IF NOT EXISTS sets ( code TEXT PRIMARY KEY , name TEXT, type TEXT, border TEXT, "
                         "mkmid INT, mkmname TEXT, releasedate TEXT, gatherercode TEXT, magiccardsinfocode TEXT, "
                         "booster TEXT, oldcode TEXT)")
+            self.db_create_card_tables(con)
+            self.db_create_indexes(con)
+            self.db_migrate(con)
+        con.close()
 
-            con.execute('CREATE TABLE IF NOT EXISTS card_names ('
-                        'multiverseid INT NOT NULL,'
-                        'name TEXT)')
-
-            con.execute('CREATE TABLE IF NOT EXISTS card_types ('
-                        'multiverseid INT NOT NULL,'
-                        'type TEXT)')
-
-            con.execute('CREATE TABLE IF NOT EXISTS card_subtypes ('
-                        'multiverseid INT NOT NULL,'
-                        'subtype TEXT)')
-
-            con.execute('CREATE TABLE IF NOT EXISTS card_supertypes ('
-                        'multiverseid INT NOT NULL,'
-                        'supertype TEXT)')
-
-            con.execute('CREATE TABLE IF NOT EXISTS card_printings ('
-                        'multiverseid INT NOT NULL,'
-                        'code TEXT)')
-
-            con.execute('CREATE TABLE IF NOT EXISTS card_variations ('
-                        'multiverseid INT NOT NULL,'
-                        'variation INT)')
-
-            con.execute('CREATE TABLE IF NOT EXISTS card_colors ('
-                        'multiverseid INT NOT NULL,'
-                        'color TEXT)')
-
-            con.execute('CREATE TABLE IF NOT EXISTS card_rulings ('
-                        'multiverseid INT NOT NULL,'
-                        'date TEXT,'
-                        '`text` TEXT)')
-
-            con.execute('CREATE TABLE IF NOT EXISTS card_legalities ('
-                        'multiverseid INT NOT NULL,'
-                        'format TEXT,'
-                        'legality TEXT)')
+    def db_migrate(self, con):
+        """
+        Upgrade an existing database to the current schema version
+        :param con: Database connection to use
+        """
+        version = con.execute('PRAGMA user_version').fetchone()[0]
+        if version >= self.schema_version:
+            return
+        if version < 1:
+            # Version 1 added secondary indexes (created in db_create), collect statistics for the query planner
+            con.execute('ANALYZE')
+        if version < 2:
+            # Version 2 added the full text index, fill it from existing card data
+            con.execute('DELETE FROM cards_fts')
+            con.execute("INSERT INTO cards_fts SELECT c.multiverseid, c.name, c.text, c.originalText, c.flavor, "
+                        "trim((SELECT ifnull(group_concat(supertype, ' '), '') FROM card_supertypes s "
+                        "      WHERE s.multiverseid = c.multiverseid) || ' ' || "
+                        "     (SELECT ifnull(group_concat(type, ' '), '') FROM card_types t "
+                        "      WHERE t.multiverseid = c.multiverseid) || ' ' || "
+                        "     (SELECT ifnull(group_concat(subtype, ' '), '') FROM card_subtypes st "
+                        "      WHERE st.multiverseid = c.multiverseid)) "
+                        "FROM cards c")
+        con.execute('PRAGMA user_version = {}'.format(self.schema_version))
+
+    def db_create_indexes(self, con, tables=None):
+        """
+        Create the secondary indexes of the database if they do not exist
+        :param con: Database connection to use
+        :param tables: (Optional) only create indexes of these tables
+        """
+        for table, column in self.indexes:
+            if tables is not None and table not in tables:
+                continue
+            con.execute('CREATE INDEX IF NOT EXISTS idx_{0}_{1} ON {0} (`{1}`)'.format(table, column))
 
-            con.execute('CREATE TABLE IF NOT EXISTS card_foreign_names ('
-                        'multiverseid INT NOT NULL,'
-                        'language TEXT,'
-                        'name TEXT)')
+    @staticmethod
+    def db_create_card_tables(con):
+        """
+        Create the tables holding card resource data
+        :param con: Database connection to use
+        """
+        con.execute('CREATE TABLE IF NOT EXISTS cards ('
+                    'multiverseid INT, name TEXT, layout TEXT, manaCost TEXT, fcolor TEXT, cmc INT, '
+                    'rarity TEXT, text TEXT, flavor TEXT, artist TEXT, number INTEGER, power TEXT, '
+                    'toughness TEXT, loyalty INT, watermark TEXT, border TEXT, timeshifted INT, '
+                    'hand TEXT, life TEXT, releaseDate TEXT, starter TEXT, originalText TEXT, originalType TEXT, '
+                    'source TEXT, imageUrl TEXT, `set` TEXT, setName TEXT, id TEXT)')
+
+        # Full text index for searching names, rules text and flavor
+        con.execute('CREATE VIRTUAL TABLE IF NOT EXISTS cards_fts USING fts5('
+                    'multiverseid UNINDEXED, name, text, original_text, flavor, type, '
+                    'tokenize = "unicode61 remove_diacritics 2", prefix = "2 3")')
+
+        con.execute('CREATE TABLE IF NOT EXISTS card_names ('
+                    'multiverseid INT NOT NULL,'
+                    'name TEXT)')
+
+        con.execute('CREATE TABLE IF NOT EXISTS card_types ('
+                    'multiverseid INT NOT NULL,'
+                    'type TEXT)')
+
+        con.execute('CREATE TABLE IF NOT EXISTS card_subtypes ('
+                    'multiverseid INT NOT NULL,'
+                    'subtype TEXT)')
+
+        con.execute('CREATE TABLE IF NOT EXISTS card_supertypes ('
+                    'multiverseid INT NOT NULL,'
+                    'supertype TEXT)')
+
+        con.execute('CREATE TABLE IF NOT EXISTS card_printings ('
+                    'multiverseid INT NOT NULL,'
+                    'code TEXT)')
+
+        con.execute('CREATE TABLE IF NOT EXISTS card_variations ('
+                    'multiverseid INT NOT NULL,'
+                    'variation INT)')
+
+        con.execute('CREATE TABLE IF NOT EXISTS card_colors ('
+                    'multiverseid INT NOT NULL,'
+                    'color TEXT)')
+
+        con.execute('CREATE TABLE IF NOT EXISTS card_rulings ('
+                    'multiverseid INT NOT NULL,'
+                    'date TEXT,'
+                    '`text` TEXT)')
+
+        con.execute('CREATE TABLE IF NOT EXISTS card_legalities ('
+                    'multiverseid INT NOT NULL,'
+                    'format TEXT,'
+                    'legality TEXT)')
+
+        con.execute('CREATE TABLE IF NOT EXISTS card_foreign_names ('
+                    'multiverseid INT NOT NULL,'
+                    'language TEXT,'
+                    'name TEXT)')
 
     def db_get_all(self):
         """Return data of all cards in database"""
@@ -106,13 +184,66 @@ class CardvaultDB:
         con = sqlite3.connect(self.db_file)
         try:
             with con:
-                tables = ['cards', 'sets', 'card_colors', 'card_foreign_names', 'card_legalities', 'card_names',
-                          'card_printings', 'card_rulings', 'card_subtypes', 'card_supertypes', 'card_types',
-                          'card_variations']
-                for table in tables:
-                    con.execute("DELETE FROM {}".format(table))
+                con.execute("DELETE FROM sets")
+                # Dropping is much faster than deleting every row
+                for table in self.card_tables:
+                    con.execute("DROP TABLE IF EXISTS {}".format(table))
+            self.db_create()
         except Exception as e:
             print(e)
+        finally:
+            con.close()
+
+    def db_rebuild_data_card(self, card_batches, batch_size: int = None) -> float:
+        """
+        Replace all card data in the database in fast-load mode.
+        The card tables are dropped and recreated without indexes, all cards are inserted with relaxed durability
+        settings and the indexes are built after loading. Everything runs in one transaction so the old data is kept
+        if the rebuild fails.
+        The rebuild uses its own connection, unsaved changes of this connection have to be saved or discarded first.
+        :param card_batches: Iterable of lists of cv_core.models.Card objects (e.g. CoreUtilities.iter_mtgjson_cards)
+        :param batch_size: (Optional) number of cards per insert batch, defaults to CoreConfig.insert_batch_size
+        :return: Number of inserted rows per second
+        :raises sqlite3.Error: If the rebuild failed, the old card data is kept
+        """
+        if self.db_unsaved_changes():
+            # The open transaction would lock the database for the rebuild connection
+            raise sqlite3.OperationalError('Unsaved changes, save or discard them before rebuilding the card data')
+        batch_size = batch_size or CoreConfig.insert_batch_size
+        con = sqlite3.connect(self.db_file, isolation_level=None)
+        start = time.perf_counter()
+        row_count = 0
+        # Remember current settings to restore them afterwards
+        old_pragmas = {name: con.execute('PRAGMA {}'.format(name)).fetchone()[0] for name in self.rebuild_pragmas}
+        try:
+            for name, value in self.rebuild_pragmas.items():
+                con.execute('PRAGMA {} = {}'.format(name, value))
+            con.execute('BEGIN')
+            for table in self.card_tables:
+                con.execute("DROP TABLE IF EXISTS {}".format(table))
+            self.db_create_card_tables(con)
+            for card_list in card_batches:
+                for index in range(0, len(card_list), batch_size):
+                    row_count += self.card_insert_batch(card_list[index:index + batch_size], con)
+            # Building indexes once after loading is faster than updating them for every row
+            self.db_create_indexes(con, self.card_tables)
+            con.execute("INSERT INTO cards_fts (cards_fts) VALUES ('optimize')")
+            con.execute('ANALYZE')
+            con.execute('COMMIT')
+        finally:
+            # Roll back on any error (e.g. a malformed AllSets file) and pass the error on,
+            # pragmas can not be changed inside a transaction
+            try:
+                if con.in_transaction:
+                    con.execute('ROLLBACK')
+                for name, value in old_pragmas.items():
+                    con.execute('PRAGMA {} = {}'.format(name, value))
+            except sqlite3.Error as e:
+                print(e)
+            finally:
+                con.close()
+        elapsed = time.perf_counter() - start
+        return row_count / elapsed if elapsed else 0.0
 
     def db_clear_data_user(self):
         """Delete all user data from database"""
@@ -122,16 +253,30 @@ class CardvaultDB:
 
     # Card operations ##################################################################################################
 
-    def card_insert_many(self, card_list: list):
+    def card_insert_many(self, card_list: list, batch_size: int = None) -> float:
         """
-        Shorthand for inserting many cards at once
-        Uses a single database connection for all commits
+        Insert many cards at once using a single database connection.
+        Rows are collected per table and each table is written with one executemany per batch.
         :param card_list: list of cv_core.models.Card objects
+        :param batch_size: (Optional) number of cards per batch, defaults to CoreConfig.insert_batch_size
+        :return: Number of inserted rows per second
         """
+        batch_size = batch_size or CoreConfig.insert_batch_size
         con = sqlite3.connect(self.db_file)
-        with con:
-            for card in card_list:
-                self.card_insert(card, con)
+        start = time.perf_counter()
+        row_count = 0
+        try:
+            with con:
+                for index in range(0, len(card_list), batch_size):
+                    row_count += self.card_insert_batch(card_list[index:index + batch_size], con)
+        except sqlite3.OperationalError as e:
+            print(e)
+        except sqlite3.IntegrityError as e:
+            print(e)
+        finally:
+            con.close()
+        elapsed = time.perf_counter() - start
+        return row_count / elapsed if elapsed else 0.0
 
     def card_insert(self, card, connection=None):
         """
@@ -147,35 +292,7 @@ class CardvaultDB:
         else:
             con = connection
         try:
-            # List attributes of card object are written in connection tables
-            mapping = {'card_names': card.names, 'card_types': card.types, 'card_subtypes': card.subtypes,
-                       'card_supertypes': card.supertypes, 'card_printings': card.printings,
-                       'card_variations': card.variations, 'card_colors': card.colors}
-
-            for table_name, values in mapping.items():
-                if not values:
-                    continue
-                db_values = [(card.multiverse_id, value) for value in values]
-                sql_string = "INSERT INTO {} VALUES (?, ?)".format(table_name)
-                con.executemany(sql_string, db_values)
-
-            # Insert dict attributes into separate tables
-            mapping = {'card_rulings': [card.rulings, 'date', 'text'],
-                       'card_legalities': [card.legalities, 'format', 'legality'],
-                       'card_foreign_names': [card.foreign_names, 'language', 'name']}
-
-            for table_name, data in mapping.items():
-                if not data[0]:
-                    continue
-                db_values = [(card.multiverse_id, x.get(data[1]), x.get(data[2])) for x in data[0]]
-                sql_string = "INSERT INTO {} VALUES (?, ?, ?)".format(table_name)
-                con.executemany(sql_string, db_values)
-
-            # Write card attributes to database
-            card_row = self.map_card_to_row(card)
-            sql_string = "INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,"\
-                         "?, ?, ?, ?, ?, ?, ?)"
-            con.execute(sql_string, card_row)
+            self.table_rows_insert(self.map_card_to_table_rows(card), con)
         except sqlite3.OperationalError as e:
             print(e)
         except sqlite3.IntegrityError as e:
@@ -184,38 +301,116 @@ class CardvaultDB:
             if not connection:
                 con.close()
 
+    def card_insert_batch(self, card_list: list, con) -> int:
+        """
+        Insert a batch of cards with one executemany per table
+        :param card_list: list of cv_core.models.Card objects
+        :param con: Database connection to use
+        :return: Number of written rows
+        """
+        table_rows = {}
+        for card in card_list:
+            for table_name, rows in self.map_card_to_table_rows(card).items():
+                table_rows.setdefault(table_name, []).extend(rows)
+        return self.table_rows_insert(table_rows, con)
+
+    @staticmethod
+    def table_rows_insert(table_rows: dict, con) -> int:
+        """
+        Write rows into their tables with one executemany per table
+        :param table_rows: Dict with table names as keys and lists of row tuples as values
+        :param con: Database connection to use
+        :return: Number of written rows
+        """
+        count = 0
+        for table_name, rows in table_rows.items():
+            if not rows:
+                continue
+            sql_string = "INSERT INTO {} VALUES ({})".format(table_name, ", ".join("?" * len(rows[0])))
+            con.executemany(sql_string, rows)
+            count += len(rows)
+        return count
+
     def card_load(self, card_id: int):
         """
         Load a single card from database
         :param card_id: multiverse_id of the card
         :return: an cv_core.models.Card object
         """
+        return self.card_load_many([card_id])[0]
+
+    def card_load_many(self, card_ids, details: bool = True) -> list:
+        """
+        Load many cards from database with a fixed number of queries
+        The cards row and every side table are fetched once for all ids and grouped by multiverse id.
+        :param card_ids: Iterable of multiverse ids
+        :param details: Load the detail attributes of the cards (see cv_core.models.Card.detail_attributes).
+        If False they are loaded from the database on first access.
+        :return: List of cv_core.models.Card objects in the order of the supplied ids. Unknown ids are skipped.
+        """
+        card_ids = list(dict.fromkeys(card_ids))
+        if not card_ids:
+            return []
         cur = self.connection.cursor()
         cur.row_factory = sqlite3.Row
 
-        # Fetch card row
-        cur.execute('SELECT * FROM `cards` WHERE `multiverseid` = ?', (card_id,))
-        card_dict = dict(cur.fetchall()[0])
+        # Fetch card rows
+        card_dicts = {}
+        for row in self.query_ids(cur, 'SELECT * FROM `cards` WHERE `multiverseid` IN ({})', card_ids):
+            card_dicts.setdefault(row['multiverseid'], dict(row))
 
-        # Fetch list attributes of card
+        # Fetch list attributes of cards
         attrs_list = {'card_names', 'card_types', 'card_subtypes', 'card_supertypes', 'card_printings',
                       'card_variations', 'card_colors'}
         for attr in attrs_list:
-            cur.execute('SELECT * FROM {} WHERE `multiverseid` = ?'.format(attr), (card_id,))
-            rows = cur.fetchall()
-            card_dict[attr.split('_')[1]] = [row[1] for row in rows]
+            attr_name = attr.split('_')[1]
+            for card_dict in card_dicts.values():
+                card_dict[attr_name] = []
+            for row in self.query_ids(cur, 'SELECT * FROM ' + attr + ' WHERE `multiverseid` IN ({})', card_ids):
+                card_dicts[row[0]][attr_name].append(row[1])
+
+        if details:
+            self.card_details_fetch(cur, card_dicts)
+            return [Card(card_dicts[card_id]) for card_id in card_ids if card_id in card_dicts]
+        for card_dict in card_dicts.values():
+            del card_dict['flavor']
+        return [Card(card_dicts[card_id], self.details_loader) for card_id in card_ids if card_id in card_dicts]
+
+    def card_load_details(self, card: Card):
+        """
+        Load the detail attributes of a card that was loaded without them.
+        Uses a separate connection so cards can be passed between threads.
+        :param card: An cv_core.models.Card object
+        """
+        con = sqlite3.connect(self.db_file)
+        try:
+            cur = con.cursor()
+            cur.execute('SELECT `flavor` FROM `cards` WHERE `multiverseid` = ?', (card.multiverse_id,))
+            row = cur.fetchone()
+            card_dicts = {card.multiverse_id: {'flavor': row[0] if row else None}}
+            self.card_details_fetch(cur, card_dicts)
+        finally:
+            con.close()
+        for attribute, key in Card.detail_attributes.items():
+            setattr(card, attribute, card_dicts[card.multiverse_id].get(key))
 
-        # Fetch dict attributes of card
+    def card_details_fetch(self, cur, card_dicts: dict):
+        """
+        Fetch the dict attributes of cards from their side tables and add them to the card dicts
+        :param cur: Cursor to use
+        :param card_dicts: Dict with multiverse ids as keys and card dicts as values
+        """
+        card_ids = list(card_dicts.keys())
         attrs_list = {'card_rulings': ['date', 'text'],
                       'card_legalities': ['format', 'legality'],
                       'card_foreign_names': ['language', 'name']}
         for table_name, attrs in attrs_list.items():
-            cur.execute('SELECT {}, {} FROM {} WHERE `multiverseid` = ?'.format(attrs[0], attrs[1], table_name),
-                        (card_id,))
-            rows = cur.fetchall()
             attr_name = '_'.join(table_name.split('_')[1:])
-            card_dict[attr_name] = {row[0]: row[1] for row in rows}
-        return Card(card_dict)
+            for card_dict in card_dicts.values():
+                card_dict[attr_name] = {}
+            sql = 'SELECT `multiverseid`, `{}`, `{}` FROM {} '.format(attrs[0], attrs[1], table_name)
+            for row in self.query_ids(cur, sql + 'WHERE `multiverseid` IN ({})', card_ids):
+                card_dicts[row[0]][attr_name][row[1]] = row[2]
 
     def card_search_by_name(self, search_term):
         """
@@ -224,10 +419,113 @@ class CardvaultDB:
         :param search_term: Search String
         :return: List of 'cv_core.models.Card' objects
         """
+        return self.card_search_fulltext(CardQuery.fts_query(search_term, columns=('name',)), 50)
+
+    def card_search_fulltext(self, fts_query: str, limit: int = 50) -> list:
+        """
+        Search cards with the full text index, best matches first.
+        :param fts_query: FTS5 query string (see CardQuery.fts_query), an empty query returns the first cards in the
+        database
+        :param limit: Maximum number of results
+        :return: List of 'cv_core.models.Card' objects
+        """
         cur = self.connection.cursor()
-        cur.row_factory = sqlite3.Row
-        cur.execute("SELECT `multiverseid` FROM `cards` WHERE `name` LIKE ? LIMIT 50", ('%' + search_term + '%',))
-        return [self.card_load(row[0]) for row in cur.fetchall()]
+        if fts_query:
+            weights = ', '.join(str(weight) for weight in self.fts_weights)
+            cur.execute('SELECT `multiverseid` FROM cards_fts WHERE cards_fts MATCH ? '
+                        'ORDER BY bm25(cards_fts, {}) LIMIT ?'.format(weights), (fts_query, limit))
+        else:
+            cur.execute('SELECT `multiverseid` FROM `cards` LIMIT ?', (limit,))
+        return self.card_load_many((row[0] for row in cur.fetchall()), details=False)
+
+    def card_ids_by_name(self) -> list:
+        """
+        Return the ids of all cards in alphabetical order
+        :return: List of multiverse ids
+        """
+        cur = self.connection.execute('SELECT `multiverseid` FROM `cards` WHERE `multiverseid` IS NOT NULL '
+                                      'GROUP BY `multiverseid` ORDER BY min(`name`)')
+        return [row[0] for row in cur.fetchall()]
+
+    def card_sort_ids(self, card_ids: list, attribute: str, descending: bool = False) -> list:
+        """
+        Sort card ids in SQL without loading the cards
+        :param card_ids: List of multiverse ids
+        :param attribute: Sort order, see sort_expression
+        :param descending: Sort in descending order
+        :return: List of the ids in the new order, cards with equal values keep their previous order
+        """
+        # A separate connection keeps the temporary table from starting a transaction on the main connection
+        con = sqlite3.connect(self.db_file)
+        try:
+            con.execute('CREATE TEMP TABLE sort_ids (position INTEGER PRIMARY KEY, multiverseid INT)')
+            con.executemany('INSERT INTO sort_ids VALUES (?, ?)', enumerate(card_ids))
+            cur = con.execute('SELECT s.multiverseid FROM sort_ids s '
+                              'ORDER BY (SELECT {0} FROM `cards` c WHERE c.multiverseid = s.multiverseid LIMIT 1) {1}, '
+                              's.position'.format(self.sort_expression(attribute), 'DESC' if descending else 'ASC'))
+            return [row[0] for row in cur.fetchall()]
+        finally:
+            con.close()
+
+    @staticmethod
+    def sort_expression(attribute: str) -> str:
+        """
+        Return the SQL expression of a sort order for a card row aliased as 'c'.
+        The orders match the sort keys of the card views.
+        :param attribute: One of 'name', 'set_name', 'types', 'rarity' (by MTGConstants.rarities), 'color'
+        (WUBRG, multicolor, colorless, then by converted mana cost) or 'number' (collector number, '12b' after '12a')
+        :return: SQL expression
+        """
+        if attribute == 'name':
+            return 'c.name'
+        if attribute == 'set_name':
+            return 'c.setName'
+        if attribute == 'types':
+            return "(SELECT group_concat(`type`, ' ') FROM card_types t WHERE t.multiverseid = c.multiverseid)"
+        if attribute == 'rarity':
+            ranks = ' '.join("WHEN '{}' THEN {}".format(rarity, rank)
+                             for rank, rarity in enumerate(MTGConstants.rarities))
+            return 'CASE lower(c.rarity) {} ELSE -1 END'.format(ranks)
+        if attribute == 'color':
+            groups = ' '.join("WHEN '{}' THEN {}".format(color, MTGConstants.mana_order.index(shorthand))
+                              for color, shorthand in MTGConstants.color_shorthands.items())
+            multicolor = len(MTGConstants.mana_order)
+            return ('(CASE (SELECT count(*) FROM card_colors cc WHERE cc.multiverseid = c.multiverseid) '
+                    'WHEN 0 THEN {0} '
+                    'WHEN 1 THEN (SELECT CASE cc.color {1} ELSE {2} END FROM card_colors cc '
+                    '             WHERE cc.multiverseid = c.multiverseid) '
+                    'ELSE {2} END) * 1000 + min(CAST(ifnull(c.cmc, 0) AS INTEGER), 999)'
+                    .format(multicolor + 1, groups, multicolor))
+        if attribute == 'number':
+            suffix = "substr(ltrim(lower(c.number), '0123456789'), 1, 1)"
+            return ("ifnull(CAST(c.number AS INTEGER), 0) * 100 + "
+                    "CASE WHEN {0} BETWEEN 'a' AND 'z' THEN unicode({0}) - 96 ELSE 0 END".format(suffix))
+        raise ValueError('Unknown sort order "{}"'.format(attribute))
+
+    def card_names_fulltext(self, fts_query: str) -> list:
+        """
+        Return ids and names of all cards matching a full text query in alphabetical order
+        :param fts_query: FTS5 query string (see CardQuery.fts_query), an empty query matches all cards
+        :return: List of (multiverse id, name) tuples
+        """
+        cur = self.connection.cursor()
+        if fts_query:
+            cur.execute('SELECT `multiverseid`, `name` FROM cards_fts WHERE cards_fts MATCH ? ORDER BY `name`',
+                        (fts_query,))
+        else:
+            cur.execute('SELECT `multiverseid`, `name` FROM `cards` ORDER BY `name`')
+        return cur.fetchall()
+
+    def card_common_mana_costs(self, limit: int) -> list:
+        """
+        Return the mana costs used by most cards
+        :param limit: Maximum number of mana costs
+        :return: List of mana cost strings ('{3}{U}{B}'), most used first
+        """
+        cur = self.connection.cursor()
+        cur.execute('SELECT `manaCost` FROM `cards` WHERE `manaCost` IS NOT NULL AND `manaCost` != \'\' '
+                    'GROUP BY `manaCost` ORDER BY COUNT(*) DESC LIMIT ?', (limit,))
+        return [row[0] for row in cur.fetchall()]
 
     # Library operations ###############################################################################################
 
@@ -236,40 +534,124 @@ class CardvaultDB:
         Load all cards in library from database in alphabetical order
         :return: A list containing all cards in library as 'cv_core.models.Card'
         """
-        cur = self.connection.cursor()
-        cur.row_factory = sqlite3.Row
-        cur.execute('SELECT * FROM `library` INNER JOIN `cards` ON library.multiverseid = cards.multiverseid')
-        rows = cur.fetchall()
-        return sorted([self.map_row_to_card(row) for row in rows], key=lambda x: x.name)
+        return self.card_list_query('`library` l INNER JOIN `cards` c ON c.multiverseid = l.multiverseid '
+                                    'ORDER BY c.name')
 
-    def lib_card_add(self, card: Card):
-        """Insert card into library"""
-        self.db_operation("INSERT INTO `library` (`copies`, `multiverseid`) VALUES (?, ?)", (1, card.multiverse_id))
+    def lib_get_ids(self) -> list:
+        """
+        Load the ids of all cards in library in alphabetical order
+        :return: List of multiverse ids
+        """
+        cur = self.connection.execute('SELECT l.multiverseid FROM `library` l '
+                                      'INNER JOIN `cards` c ON c.multiverseid = l.multiverseid '
+                                      'GROUP BY l.multiverseid ORDER BY min(c.name)')
+        return [row[0] for row in cur.fetchall()]
+
+    def lib_card_add(self, card: Card, copies: int = 1):
+        """Insert card into library or add copies if it is already contained"""
+        self.lib_cards_add({card.multiverse_id: copies})
+
+    def lib_card_remove(self, card: Card, copies: int = None):
+        """Remove copies of a card from the library, all copies if no number is given"""
+        if copies is None:
+            self.connection.execute("DELETE FROM `library` WHERE `multiverseid` = ?", (card.multiverse_id,))
+        else:
+            self.lib_cards_remove({card.multiverse_id: copies})
 
-    def lib_card_remove(self, card: Card):
-        """Remove a from the library"""
-        self.db_operation("DELETE FROM `library` WHERE `multiverseid` = ?", (card.multiverse_id,))
+    def lib_cards_add(self, card_ids):
+        """
+        Add copies of many cards to the library with one statement
+        :param card_ids: Iterable of multiverse ids, one copy is added per occurrence, or a dict of ids and numbers of
+        copies
+        """
+        counts = self.count_ids(card_ids)
+        self.connection.executemany("INSERT INTO `library` (`multiverseid`, `copies`) VALUES (?, ?) "
+                                    "ON CONFLICT (`multiverseid`) DO UPDATE SET `copies` = `copies` + excluded.copies",
+                                    counts.items())
+
+    def lib_cards_remove(self, card_ids):
+        """
+        Remove copies of many cards from the library, cards without copies left are removed completely
+        :param card_ids: Iterable of multiverse ids, one copy is removed per occurrence, or a dict of ids and numbers
+        of copies
+        """
+        counts = self.count_ids(card_ids)
+        self.connection.executemany("UPDATE `library` SET `copies` = `copies` - ? WHERE `multiverseid` = ?",
+                                    ((copies, card_id) for card_id, copies in counts.items()))
+        self.query_ids(self.connection.cursor(), "DELETE FROM `library` WHERE `copies` <= 0 AND `multiverseid` IN ({})",
+                       list(counts))
+
+    def lib_get_copies(self) -> dict:
+        """
+        Load the number of copies of all cards in the library
+        :return: Dict with multiverse ids as keys and numbers of copies as values
+        """
+        return dict(self.connection.execute("SELECT `multiverseid`, `copies` FROM `library`"))
+
+    def lib_get_totals(self) -> tuple:
+        """
+        Count the cards in the library
+        :return: Tuple of the number of distinct cards and the number of copies
+        """
+        distinct, copies = self.connection.execute("SELECT COUNT(*), SUM(`copies`) FROM `library`").fetchone()
+        return distinct, copies or 0
+
+    def lib_get_totals_by(self, attribute: str) -> dict:
+        """
+        Count the copies in the library grouped by a card attribute
+        :param attribute: One of 'set', 'rarity' or 'color'. Multicolored cards count for each of their colors,
+        colorless cards are counted as 'Colorless'.
+        :return: Dict with attribute values as keys and numbers of copies as values
+        """
+        if attribute == 'color':
+            # Cards may be stored in more than one row (e.g. split cards), count each card once
+            sql = ("SELECT ifnull(cc.color, 'Colorless'), SUM(l.copies) FROM `library` l "
+                   "LEFT JOIN (SELECT DISTINCT `multiverseid`, `color` FROM `card_colors`) cc "
+                   "ON cc.multiverseid = l.multiverseid GROUP BY 1")
+        elif attribute in ('set', 'rarity'):
+            sql = ("SELECT c.`{0}`, SUM(l.copies) FROM `library` l INNER JOIN "
+                   "(SELECT `multiverseid`, `{0}` FROM `cards` GROUP BY `multiverseid`) c "
+                   "ON c.multiverseid = l.multiverseid GROUP BY 1".format(attribute))
+        else:
+            raise ValueError('Unknown attribute "{}"'.format(attribute))
+        return dict(self.connection.execute(sql))
 
     # Category operations ##############################################################################################
 
     def category_get_all(self) -> dict:
         """Loads a dict from database with all categories and the card ids they contain"""
-        cur = self.connection.cursor()
-        cur.row_factory = sqlite3.Row
-
-        # First load all tags
-        cur.execute("SELECT `tag` FROM tags GROUP BY `tag`")
-        # Create dict with the fetched categories as key
-        cats = {row['tag']: [] for row in cur.fetchall()}
-
-        # Go trough all categories an load the card ids
-        for cat in cats.keys():
-            cur.execute('SELECT `multiverseid` FROM `tags` WHERE tags.tag = ? AND multiverseid NOT NULL', (cat,))
-            rows = cur.fetchall()
-            for row in rows:
-                cats[cat].append(row["multiverseid"])
+        cats = {}
+        # Empty categories are stored as a row without card id
+        for tag, card_id in self.connection.execute("SELECT `tag`, `multiverseid` FROM `tags` ORDER BY `tag`, rowid"):
+            card_ids = cats.setdefault(tag, [])
+            if card_id is not None:
+                card_ids.append(card_id)
         return cats
 
+    def category_get_cards(self) -> list:
+        """
+        Load all cards contained in any category with a single query
+        :return: List of 'cv_core.models.Card' objects in alphabetical order, each card only once
+        """
+        return self.card_list_query('`cards` c WHERE c.multiverseid IN (SELECT `multiverseid` FROM `tags`) '
+                                    'ORDER BY c.name')
+
+    def category_get_untagged_cards(self) -> list:
+        """
+        Load all cards in library that are not contained in any category
+        :return: List of 'cv_core.models.Card' objects in alphabetical order
+        """
+        return self.card_list_query('`library` l INNER JOIN `cards` c ON c.multiverseid = l.multiverseid '
+                                    'LEFT JOIN `tags` t ON t.multiverseid = l.multiverseid '
+                                    'WHERE t.tag IS NULL ORDER BY c.name')
+
+    def category_get_counts(self) -> dict:
+        """
+        Count the cards in every category
+        :return: Dict with category names as keys and numbers of cards as values
+        """
+        return dict(self.connection.execute("SELECT `tag`, COUNT(DISTINCT `multiverseid`) FROM `tags` GROUP BY `tag`"))
+
     def category_new(self, name: str):
         """Add a new category to the database"""
         self.db_operation("INSERT INTO `tags` VALUES (?, NULL)", (name,))
@@ -301,22 +683,14 @@ class CardvaultDB:
     # Wants operations #################################################################################################
 
     def wants_get_all(self) -> dict:
-        """Load all wants lists from database"""
-        cur = self.connection.cursor()
-        cur.row_factory = sqlite3.Row
-
-        # First load all lists
-        cur.execute("SELECT `listName` FROM wants GROUP BY `listName`")
-        wants = {row['listName']: [] for row in cur.fetchall()}
-
-        # Go trough all tags an load the card ids
-        for list_name in wants.keys():
-            cur.execute('SELECT * FROM '
-                        '(SELECT `multiverseid` FROM `wants` WHERE `listName` = ? AND multiverseid NOT NULL) tagged '
-                        'INNER JOIN `cards` ON tagged.multiverseid = cards.multiverseid', (list_name,))
-            rows = cur.fetchall()
-            for row in rows:
-                wants[list_name].append(self.map_row_to_card(row))
+        """Load all wants lists from database with the card ids they contain"""
+        wants = {}
+        # Empty lists are stored as a row without card id
+        for list_name, card_id in self.connection.execute("SELECT `listName`, `multiverseid` FROM `wants` "
+                                                          "ORDER BY `listName`, rowid"):
+            card_ids = wants.setdefault(list_name, [])
+            if card_id is not None:
+                card_ids.append(card_id)
         return wants
 
     def wants_new(self, name: str):
@@ -343,41 +717,20 @@ class CardvaultDB:
 
     def search_by_name_filtered(self, term: str, filters: dict, list_size: int) -> list:
         """Search for cards based on the cards name with filter constrains"""
-        filter_rarity = filters["rarity"]
-        filer_type = filters["type"]
-        filter_set = filters["set"]
-        filter_mana = filters["mana"]
-        filter_mana.sort(key=lambda x: MTGConstants.mana_order.index(x))
-
-        sql = 'SELECT * FROM cards WHERE `name` LIKE ?'
-        parameters = ['%' + term + '%']
-        if filter_rarity != "":
-            sql += ' AND `rarity` = ?'
-            parameters.append(filter_rarity)
-        if filer_type != "":
-            sql += ' AND `types` LIKE ?'
-            parameters.append('%' + filer_type + '%')
-        if filter_set != "":
-            sql += ' AND `set` = ?'
-            parameters.append(filter_set)
-        if len(filter_mana) != 0:
-            sql += ' AND `fcolor` = ?'
-            parameters.append(self.filter_colors_list(filter_mana))
-        sql += ' LIMIT ?'
-        parameters.append(str(list_size))
-
-        con = sqlite3.connect(self.db_file)
-        cur = con.cursor()
-        cur.row_factory = sqlite3.Row
-        cur.execute(sql, parameters)
-        rows = cur.fetchall()
-        con.close()
+        query = CardQuery().name(term).rarity(filters["rarity"]).types(filters["type"]).sets(filters["set"])
+        if filters["mana"]:
+            query.colors(filters["mana"], CardQuery.COLORS_EXACT)
+        return self.card_search_query(query, list_size)
 
-        output = []
-        for row in rows:
-            card = self.map_row_to_card(row)
-            output.append(card)
-        return output
+    def card_search_query(self, query: CardQuery, limit: int = None) -> list:
+        """
+        Search cards matching a query
+        :param query: A cv_core.query.CardQuery object
+        :param limit: (Optional) maximum number of results
+        :return: List of 'cv_core.models.Card' objects ordered by name
+        """
+        from_clause, parameters = query.build_from(limit)
+        return self.card_list_query(from_clause, parameters)
 
     def search_by_name(self, term: str) -> dict:
         """Search for cards based on the cards name"""
@@ -413,6 +766,57 @@ class CardvaultDB:
             output[card.multiverse_id] = card
         return output
 
+    def card_list_query(self, from_clause: str, parameters: tuple = ()) -> list:
+        """
+        Load cards for display in lists with a single query
+        List attributes are aggregated from the side tables with group_concat, detail attributes are loaded on first
+        access.
+        :param from_clause: FROM clause of the query, the cards table must be aliased as 'c'. May be followed by
+        WHERE and ORDER BY clauses.
+        :param parameters: Parameters of the query
+        :return: List of 'cv_core.models.Card' objects in the order of the query, each multiverse id only once
+        """
+        columns = ', '.join('(SELECT group_concat(`{1}`, char(31)) FROM {0} WHERE {0}.multiverseid = c.multiverseid) '
+                            'AS {2}'.format(table, column, table.split('_')[1])
+                            for table, column in self.list_attribute_tables)
+        cur = self.connection.cursor()
+        cur.row_factory = sqlite3.Row
+        cur.execute('SELECT c.*, {} FROM {}'.format(columns, from_clause), parameters)
+        cards = []
+        card_ids = set()
+        for row in cur:
+            if row['multiverseid'] in card_ids:
+                continue
+            card_ids.add(row['multiverseid'])
+            cards.append(self.map_row_to_card(row, self.details_loader))
+        return cards
+
+    @staticmethod
+    def count_ids(card_ids) -> dict:
+        """
+        Count the occurrences of multiverse ids
+        :param card_ids: Iterable of multiverse ids or a dict of ids and counts
+        :return: Dict with multiverse ids as keys and positive counts as values
+        """
+        counts = card_ids if isinstance(card_ids, dict) else collections.Counter(card_ids)
+        return {card_id: count for card_id, count in counts.items() if count > 0}
+
+    def query_ids(self, cur, sql: str, ids: list) -> list:
+        """
+        Run a query with an 'IN ({})' placeholder for a list of ids
+        Large id lists are split into chunks to stay below the sqlite parameter limit.
+        :param cur: Cursor to use
+        :param sql: Query with a '{}' format placeholder inside the IN clause
+        :param ids: List of ids to bind
+        :return: List of all result rows
+        """
+        rows = []
+        for index in range(0, len(ids), self.max_query_params):
+            chunk = ids[index:index + self.max_query_params]
+            cur.execute(sql.format(', '.join('?' * len(chunk))), chunk)
+            rows.extend(cur.fetchall())
+        return rows
+
     def db_operation(self, sql: str, args: tuple = ()):
         """Perform an arbitrary sql operation on the database"""
         cur = self.connection.cursor()
@@ -453,6 +857,36 @@ class CardvaultDB:
 
         return "-".join(output)
 
+    def map_card_to_table_rows(self, card) -> dict:
+        """
+        Return the rows of all tables that represent a card object
+        :param card: An cv_core.models.Card object
+        :return: Dict with table names as keys and lists of row tuples as values
+        """
+        if not card.multiverse_id:
+            return {}
+        # List attributes of card object are written in connection tables
+        mapping = {'card_names': card.names, 'card_types': card.types, 'card_subtypes': card.subtypes,
+                   'card_supertypes': card.supertypes, 'card_printings': card.printings,
+                   'card_variations': card.variations, 'card_colors': card.colors}
+        table_rows = {table_name: [(card.multiverse_id, value) for value in values]
+                      for table_name, values in mapping.items() if values}
+
+        # Insert dict attributes into separate tables
+        mapping = {'card_rulings': [card.rulings, 'date', 'text'],
+                   'card_legalities': [card.legalities, 'format', 'legality'],
+                   'card_foreign_names': [card.foreign_names, 'language', 'name']}
+        for table_name, data in mapping.items():
+            if not data[0]:
+                continue
+            table_rows[table_name] = [(card.multiverse_id, x.get(data[1]), x.get(data[2])) for x in data[0]]
+
+        # Card attributes
+        table_rows['cards'] = [self.map_card_to_row(card)]
+        table_rows['cards_fts'] = [(card.multiverse_id, card.name, card.text, card.original_text, card.flavor,
+                                    card.type)]
+        return table_rows
+
     def map_card_to_row(self, card):
         """Return the database representation of a card object"""
         return (card.multiverse_id, card.name, card.layout, card.mana_cost, self.filter_colors(card), card.cmc,
@@ -461,56 +895,23 @@ class CardvaultDB:
                 card.original_text, card.original_type, card.source, card.image_url, card.set, card.set_name, card.id)
 
     @staticmethod
-    def map_row_to_card(row):
-        """Return card object representation of a table row"""
-        card = Card()
-        card.multiverse_id = row["multiverseid"]
-        tmp = row["name"]
-        card.name = tmp
-        card.layout = row["layout"]
-        card.mana_cost = row["manacost"]
-        card.cmc = row["cmc"]
-        card.colors = row["colors"]
-        card.type = row["type"]
-        card.rarity = row["rarity"]
-        card.text = row["text"]
-        card.flavor = row["flavor"]
-        card.artist = row["artist"]
-        card.number = row["number"]
-        card.power = row["power"]
-        card.toughness = row["toughness"]
-        card.loyalty = row["loyalty"]
-        card.watermark = row["watermark"]
-        card.border = row["border"]
-        card.hand = row["hand"]
-        card.life = row["life"]
-        card.release_date = row["releaseDate"]
-        card.starter = row["starter"]
-        card.original_text = row["originalText"]
-        card.original_type = row["originalType"]
-        card.source = row["source"]
-        card.image_url = row["imageUrl"]
-        card.set = row["set"]
-        card.set_name = row["setName"]
-        card.id = row["id"]
-
-        # # Bool attributes
-        # card.timeshifted = ast.literal_eval(row["timeshifted"])
-        #
-        # # List attributes
-        # card.names = ast.literal_eval(row["names"])
-        # card.supertypes = ast.literal_eval(row["supertypes"])
-        # card.subtypes = ast.literal_eval(row["subtypes"])
-        # card.types = ast.literal_eval(row["types"])
-        # card.printings = ast.literal_eval(row["printings"])
-        # card.variations = ast.literal_eval(row["variations"])
-        #
-        # # Dict attributes
-        # card.legalities = ast.literal_eval(row["legalities"])
-        # card.rulings = ast.literal_eval(row["rulings"])
-        # card.foreign_names = ast.literal_eval(row["foreignNames"])
-
-        return card
+    def map_row_to_card(row, details_loader=None):
+        """
+        Return card object representation of a table row
+        :param row: sqlite3.Row of the cards table, optionally with list attributes aggregated by group_concat
+        :param details_loader: (Optional) callable to load detail attributes on first access, see cv_core.models.Card
+        """
+        card_dict = dict(row)
+        for table, _ in CardvaultDB.list_attribute_tables:
+            attribute = table.split('_')[1]
+            if attribute in card_dict:
+                values = card_dict[attribute]
+                card_dict[attribute] = values.split(CardvaultDB.list_separator) if values else []
+        if card_dict.get('variations'):
+            card_dict['variations'] = [int(value) for value in card_dict['variations']]
+        if details_loader:
+            card_dict.pop('flavor', None)
+        return Card(card_dict, details_loader)
 
     @staticmethod
     def map_set_to_row(set):
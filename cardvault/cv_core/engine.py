@@ -1,7 +1,13 @@
+import collections
 import os
 import itertools
+import threading
 
+from cv_core.card_cache import CardCache
 from cv_core.database import CardvaultDB
+from cv_core.filter_index import CardFilterIndex
+from cv_core.query import CardQuery
+from cv_core.search import SearchWorker
 from cv_core.util import CoreConfig, CoreConstants, CoreUtilities
 
 
@@ -14,6 +20,19 @@ class CardvaultEngine:
             CoreUtilities.apply_config(config_file)
         db_file_path = os.path.join(CoreConstants.config_path, CoreConfig.db_file)
         self.database = CardvaultDB(db_file_path)
+        # Background worker for searches as you type, started on first use
+        self.search_worker = None
+        # In-memory filter index of all cards, built in the background or on first use
+        self.filter_index = None
+        self.filter_index_thread = None
+        # Incremented when the card data changes, indexes of older card data are dropped
+        self.card_data_version = 0
+        # Cards shared by the card lists of the engine
+        self.card_cache = CardCache(self.database)
+        # Card ids of all wants lists, loaded on first use
+        self.wants = None
+        # Number of wants lists containing a card by multiverse id
+        self.wanted_counts = collections.Counter()
 
     def get_card(self, card_id):
         """ Load a card object from database
@@ -22,24 +41,235 @@ class CardvaultEngine:
         """
         return self.database.card_load(card_id)
 
+    def get_cards(self, card_ids) -> list:
+        """ Load many card objects from database for display in lists
+        :param card_ids: Iterable of multiverse ids
+        :return: List of cv_core.model.Card objects in the order of the ids, details are loaded on first access
+        """
+        return self.card_cache.get_many(card_ids)
+
+    def get_common_mana_costs(self, limit=100) -> list:
+        """ Get the mana costs shared by most cards, e.g. to prepare their icons in advance
+        :param limit: Maximum number of mana costs
+        :return: List of mana cost strings, most used first
+        """
+        return self.database.card_common_mana_costs(limit)
+
+    def get_card_ids(self) -> list:
+        """ Get the ids of all cards
+        :return: Alphabetically ordered list of multiverse ids
+        """
+        return self.database.card_ids_by_name()
+
+    def sort_card_ids(self, card_ids, attribute, descending=False) -> list:
+        """ Sort card ids in the database without loading the cards
+        :param card_ids: List of multiverse ids
+        :param attribute: Sort order, one of 'name', 'set_name', 'types', 'rarity', 'color' or 'number'
+        :param descending: Sort in descending order
+        :return: List of the sorted ids
+        """
+        return self.database.card_sort_ids(card_ids, attribute, descending)
+
     def get_library(self) -> list:
         """ Get the complete library of cards
         :return: Alphabetically ordered list of all cards in library
         """
-        return self.database.lib_get_all()
+        return self.card_cache.add_many(self.database.lib_get_all())
+
+    def get_library_ids(self) -> list:
+        """ Get the ids of all cards in the library, e.g. to show them in a card view that loads visible rows only
+        :return: Alphabetically ordered list of multiverse ids
+        """
+        return self.database.lib_get_ids()
+
+    def get_library_copies(self) -> dict:
+        """ Get the number of copies of all cards in the library
+        :return: Dict with multiverse ids as keys and numbers of copies as values
+        """
+        return self.database.lib_get_copies()
+
+    def add_to_library(self, card_ids):
+        """ Add copies of cards to the library in the current transaction
+        :param card_ids: Iterable of multiverse ids (one copy per occurrence, e.g. a scanned stack of cards) or a dict
+        of ids and numbers of copies
+        """
+        self.database.lib_cards_add(card_ids)
+
+    def remove_from_library(self, card_ids):
+        """ Remove copies of cards from the library in the current transaction
+        :param card_ids: Iterable of multiverse ids (one copy per occurrence) or a dict of ids and numbers of copies
+        """
+        self.database.lib_cards_remove(card_ids)
+
+    def get_library_totals(self) -> tuple:
+        """ Get the size of the library
+        :return: Tuple of the number of distinct cards and the number of copies
+        """
+        return self.database.lib_get_totals()
+
+    def get_library_totals_by_set(self) -> dict:
+        """ Get the number of copies in the library per set code """
+        return self.database.lib_get_totals_by('set')
+
+    def get_library_totals_by_color(self) -> dict:
+        """ Get the number of copies in the library per color, multicolored cards count for each of their colors """
+        return self.database.lib_get_totals_by('color')
+
+    def get_library_totals_by_rarity(self) -> dict:
+        """ Get the number of copies in the library per rarity """
+        return self.database.lib_get_totals_by('rarity')
 
     def get_all_categories(self) -> dict:
         """ Get all categories an the cards that are contained within them
         :return: A dict with the category names and cv_core.models.Card objects as values
         """
         categories = self.database.category_get_all()
-        all_ids = set(itertools.chain.from_iterable(categories.values()))
-        card_objects = {card_id: self.database.card_load(card_id) for card_id in all_ids}
-        for _, card_id_list in categories:
-            for card_id in card_id_list:
-                card_id_list[card_id] = card_objects[card_id]
+        # Cards in more than one category are shared between the lists
+        card_objects = {card.multiverse_id: card for card in
+                        self.card_cache.add_many(self.database.category_get_cards())}
+        for category, card_id_list in categories.items():
+            categories[category] = [card_objects[card_id] for card_id in card_id_list if card_id in card_objects]
         return categories
 
+    def get_untagged_cards(self) -> list:
+        """ Get all cards in library that are not contained in any category
+        :return: Alphabetically ordered list of cv_core.models.Card objects
+        """
+        return self.card_cache.add_many(self.database.category_get_untagged_cards())
+
+    def get_category_counts(self) -> dict:
+        """ Get the number of cards in every category
+        :return: A dict with the category names as keys and the numbers of cards as values
+        """
+        return self.database.category_get_counts()
+
+    def import_mtgjson(self, json_file):
+        """ Import card data from an mtgjson AllSets file into the database.
+        The file is read and written one set at a time so the whole dump is never held in memory.
+        :param json_file: Path of the AllSets json file
+        :return: Number of imported cards
+        """
+        count = 0
+        for cards in CoreUtilities.iter_mtgjson_cards(json_file):
+            self.database.card_insert_many(cards)
+            count += len(cards)
+        self.card_data_changed()
+        return count
+
+    def rebuild_card_data(self, json_file):
+        """ Replace all card data in the database with the content of an mtgjson AllSets file.
+        Uses the fast-load mode of the database. Unsaved changes of the user data have to be saved or discarded first.
+        :param json_file: Path of the AllSets json file
+        :return: Number of inserted rows per second
+        :raises sqlite3.Error: If the rebuild failed, the old card data is kept
+        """
+        rows_per_second = self.database.db_rebuild_data_card(CoreUtilities.iter_mtgjson_cards(json_file))
+        self.card_data_changed()
+        return rows_per_second
+
+    def card_data_changed(self):
+        """ Drop in-memory data derived from the card data after it was changed """
+        self.filter_index = None
+        self.card_data_version += 1
+        self.card_cache.clear()
+        if self.search_worker:
+            self.search_worker.reset()
+
+    def clear_user_data(self):
+        """ Delete the library, all wants lists and all categories in the current transaction """
+        self.database.db_clear_data_user()
+        # The wants lists are loaded again on next use
+        self.wants = None
+        self.wanted_counts.clear()
+
+    def get_wants(self) -> dict:
+        """ Get all wants lists and the cards they contain
+        :return: A dict with the list names as keys and lists of cv_core.models.Card objects as values. Cards on
+        several lists are the same objects.
+        """
+        wants_ids = self.get_wants_ids()
+        cards = {card.multiverse_id: card for card in
+                 self.card_cache.get_many(set(itertools.chain.from_iterable(wants_ids.values())))}
+        return {list_name: [cards[card_id] for card_id in card_ids if card_id in cards]
+                for list_name, card_ids in wants_ids.items()}
+
+    def get_wants_ids(self) -> dict:
+        """ Get all wants lists with the ids of the cards they contain
+        :return: A dict with the list names as keys and lists of multiverse ids as values
+        """
+        if self.wants is None:
+            self.wants = self.database.wants_get_all()
+            self.wanted_counts = collections.Counter(itertools.chain.from_iterable(self.wants.values()))
+        return self.wants
+
+    @property
+    def wanted_ids(self):
+        """ Set-like view of the ids of all cards on any wants list, kept up to date when lists are changed """
+        self.get_wants_ids()
+        return self.wanted_counts.keys()
+
+    def wants_new(self, list_name):
+        """ Create an empty wants list
+        :param list_name: Name of the new list
+        """
+        wants = self.get_wants_ids()
+        if list_name not in wants:
+            self.database.wants_new(list_name)
+            wants[list_name] = []
+
+    def wants_delete(self, list_name):
+        """ Remove a wants list with all entries
+        :param list_name: Name of the list
+        """
+        self.database.wants_delete(list_name)
+        self.wanted_ids_remove(self.get_wants_ids().pop(list_name, []))
+
+    def wants_rename(self, old_name, new_name):
+        """ Rename a wants list
+        :param old_name: Current name of the list
+        :param new_name: New name of the list
+        """
+        wants = self.get_wants_ids()
+        self.database.wants_rename(old_name, new_name)
+        if old_name in wants:
+            wants.setdefault(new_name, []).extend(wants.pop(old_name))
+
+    def wants_card_add(self, list_name, card_id):
+        """ Add a card to a wants list, the list is created if it does not exist
+        :param list_name: Name of the list
+        :param card_id: Multiverse id of the card
+        """
+        self.wants_new(list_name)
+        card_ids = self.get_wants_ids()[list_name]
+        if card_id in card_ids:
+            return
+        self.database.wants_card_add(list_name, card_id)
+        card_ids.append(card_id)
+        self.wanted_counts[card_id] += 1
+
+    def wants_card_remove(self, list_name, card_id):
+        """ Remove a card from a wants list
+        :param list_name: Name of the list
+        :param card_id: Multiverse id of the card
+        """
+        card_ids = self.get_wants_ids().get(list_name, [])
+        if card_id not in card_ids:
+            return
+        self.database.wants_card_remove(list_name, card_id)
+        # The database removes all entries of the card from the list
+        removed = [entry for entry in card_ids if entry == card_id]
+        card_ids[:] = [entry for entry in card_ids if entry != card_id]
+        self.wanted_ids_remove(removed)
+
+    def wanted_ids_remove(self, card_ids):
+        """ Update the wanted card ids after entries were removed from wants lists
+        :param card_ids: Multiverse ids of the removed entries
+        """
+        for card_id in card_ids:
+            self.wanted_counts[card_id] -= 1
+            if self.wanted_counts[card_id] <= 0:
+                del self.wanted_counts[card_id]
+
     def search_by_name(self, search_term):
         """ Search database for cards witch contain the search string in their names
         :param search_term: Part of a card name
@@ -47,6 +277,120 @@ class CardvaultEngine:
         """
         return self.database.card_search_by_name(search_term)
 
+    def search_by_name_async(self, search_term, callback):
+        """ Search cards by name in a background thread
+        Superseded searches are cancelled and their results are never delivered.
+        :param search_term: Part of a card name
+        :param callback: Called from the worker thread with the search term, the list of matched cards and the
+        exception if the search failed (None otherwise). GUI frontends have to pass the results to their main loop
+        themselves.
+        :return: Number of the search request
+        """
+        if not self.search_worker:
+            self.search_worker = SearchWorker(self.database.db_file)
+        return self.search_worker.submit(search_term, callback)
+
+    def search_cancel(self):
+        """ Cancel all pending searches started with search_by_name_async """
+        if self.search_worker:
+            self.search_worker.cancel()
+
+    def search_filtered(self, query, limit=None):
+        """ Search cards with a combination of filters
+        :param query: A cv_core.query.CardQuery object
+        :param limit: (Optional) maximum number of results, defaults to CoreConfig.search_result_limit
+        :return: List of matched cards ordered by name
+        """
+        return self.database.card_search_query(query, limit or CoreConfig.search_result_limit)
+
+    def get_filter_index(self) -> CardFilterIndex:
+        """ Get the in-memory filter index of all cards, it is built on first use if prepare_filter_index was not
+        called or has not finished yet
+        """
+        thread = self.filter_index_thread
+        if thread and thread.is_alive():
+            # Wait for the background build instead of scanning the card data twice
+            thread.join()
+        if not self.filter_index:
+            self.filter_index = CardFilterIndex(self.database)
+        return self.filter_index
+
+    def prepare_filter_index(self):
+        """ Build the filter index in a background thread so filtering never has to wait for the card data scan """
+        if self.filter_index or (self.filter_index_thread and self.filter_index_thread.is_alive()):
+            return
+        self.filter_index_thread = threading.Thread(target=self.build_filter_index, args=(self.card_data_version,),
+                                                    daemon=True)
+        self.filter_index_thread.start()
+
+    def build_filter_index(self, card_data_version):
+        """ Build the filter index with a separate database connection, see prepare_filter_index
+        :param card_data_version: Version of the card data when the build was started
+        """
+        try:
+            database = CardvaultDB(self.database.db_file)
+            try:
+                index = CardFilterIndex(database)
+            finally:
+                database.connection.close()
+        except Exception as ex:
+            print('Error while building the filter index\n{}'.format(ex))
+            return
+        if card_data_version == self.card_data_version:
+            self.filter_index = index
+
+    def filter_cards(self, cards, colors=(), color_mode=CardQuery.COLORS_EXACT, identity=(),
+                     identity_mode=CardQuery.COLORS_AT_MOST, types=(), rarities=(), min_colors=None, max_colors=None):
+        """ Filter a list of cards with the in-memory filter index, without querying the database
+        Empty filter arguments are ignored.
+        :param cards: List of cv_core.models.Card objects
+        :param colors: Color shorthands for filtering by color
+        :param color_mode: How the colors are matched, one of the CardQuery.COLORS_* modes
+        :param identity: Color shorthands for filtering by color identity
+        :param identity_mode: How the color identity is matched, one of the CardQuery.COLORS_* modes
+        :param types: Card types the cards must have
+        :param rarities: Allowed rarities
+        :param min_colors: (Optional) minimum number of colors, e.g. 2 for multicolored cards
+        :param max_colors: (Optional) maximum number of colors, e.g. 2 for cards with at most two colors
+        :return: List of the matching cards in their original order
+        """
+        matching = set(self.filter_card_ids([card.multiverse_id for card in cards], colors, color_mode, identity,
+                                            identity_mode, types, rarities, min_colors, max_colors))
+        return [card for card in cards if card.multiverse_id in matching]
+
+    def filter_card_ids(self, card_ids=None, colors=(), color_mode=CardQuery.COLORS_EXACT, identity=(),
+                        identity_mode=CardQuery.COLORS_AT_MOST, types=(), rarities=(), min_colors=None,
+                        max_colors=None):
+        """ Filter card ids with the in-memory filter index, see filter_cards
+        :param card_ids: (Optional) list of multiverse ids, all cards if not given
+        :return: List of the matching ids in their original order, or in alphabetical order if no ids were given
+        """
+        index = self.get_filter_index()
+        bitmap = index.all
+        if colors:
+            bitmap &= index.filter_colors(colors, color_mode)
+        if identity:
+            bitmap &= index.filter_colors(identity, identity_mode, identity=True)
+        if types:
+            bitmap &= index.filter_types(*types)
+        if rarities:
+            bitmap &= index.filter_rarity(*rarities)
+        if min_colors is not None or max_colors is not None:
+            bitmap &= index.filter_color_count(min_colors or 0, len(index.color_bits) if max_colors is None
+                                               else max_colors)
+        return index.select(bitmap, card_ids)
+
+    def search_fulltext(self, search_term, prefix=True, phrase=False, limit=50):
+        """ Search card names, rules text, flavor and type lines, best matches first
+        :param search_term: Words to search for, all of them must match
+        :param prefix: Also match words that start with the search words
+        :param phrase: Only match the search words in the given order
+        :param limit: Maximum number of results
+        :return: List of matched cards
+        """
+        fts_query = CardQuery.fts_query(search_term, prefix=prefix, phrase=phrase)
+        return self.database.card_search_fulltext(fts_query, limit)
+
 
 if __name__ == "__main__":
     # Test code
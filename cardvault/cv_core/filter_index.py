@@ -0,0 +1,173 @@
+import re
+from array import array
+
+from cv_core.query import CardQuery
+from cv_core.util import MTGConstants
+
+
+class CardFilterIndex:
+    """
+    In-memory index for filtering the whole card pool without querying the database.
+    Every multiverse id gets a position. Colors, color identity, types and rarity of a card are stored as bit masks in
+    compact arrays indexed by position. For each attribute value the index also keeps a bitmap (a python int with one
+    bit per card position), so filters are evaluated for all cards at once with integer bit operations.
+    """
+    # Bit of every color in the color masks
+    color_bits = {color: 1 << index for index, color in enumerate(MTGConstants.mana_order)}
+    # Mana symbols in card texts
+    symbol_pattern = re.compile('{(.*?)}')
+
+    def __init__(self, database):
+        """
+        Build the index from the card data in the database
+        :param database: A cv_core.database.CardvaultDB object
+        """
+        cur = database.connection.cursor()
+        # One position per multiverse id, the halves of split cards are stored as separate rows with the same id
+        cur.execute("SELECT `multiverseid`, min(`rarity`), group_concat(`manaCost`, ''), group_concat(`text`, ' ') "
+                    "FROM `cards` WHERE `multiverseid` IS NOT NULL GROUP BY `multiverseid` ORDER BY min(`name`)")
+        rows = cur.fetchall()
+        # Multiverse ids by position and positions by multiverse id
+        self.ids = array('l', (row[0] for row in rows))
+        self.positions = {card_id: position for position, card_id in enumerate(self.ids)}
+        # Bitmap with all cards
+        self.all = (1 << len(self.ids)) - 1
+
+        # Per card masks
+        self.colors = array('B', bytes(len(self.ids)))
+        self.identity = array('B', bytes(len(self.ids)))
+        self.types = array('L', [0] * len(self.ids))
+        self.rarities = array('B', bytes(len(self.ids)))
+        # Bits and codes of types and rarities, assigned in order of appearance
+        self.type_bits = {}
+        self.rarity_codes = {}
+
+        shorthands = MTGConstants.color_shorthands
+        cur.execute('SELECT `multiverseid`, `color` FROM card_colors')
+        for card_id, color in cur.fetchall():
+            position = self.positions.get(card_id)
+            if position is not None and color in shorthands:
+                self.colors[position] |= self.color_bits[shorthands[color]]
+        cur.execute('SELECT `multiverseid`, `type` FROM card_types')
+        for card_id, card_type in cur.fetchall():
+            position = self.positions.get(card_id)
+            if position is not None:
+                bit = self.type_bits.setdefault(card_type, 1 << len(self.type_bits))
+                self.types[position] |= bit
+        for position, (_, rarity, mana_cost, text) in enumerate(rows):
+            rarity = (rarity or '').lower()
+            self.rarities[position] = self.rarity_codes.setdefault(rarity, len(self.rarity_codes))
+            self.identity[position] = self.colors[position] | self.symbol_mask(mana_cost) | self.symbol_mask(text)
+
+        # Bitmaps per attribute value
+        self.color_bitmaps = self.build_bitmaps(self.colors, self.color_bits.values())
+        self.identity_bitmaps = self.build_bitmaps(self.identity, self.color_bits.values())
+        self.type_bitmaps = self.build_bitmaps(self.types, self.type_bits.values())
+        self.rarity_bitmaps = self.build_value_bitmaps(self.rarities)
+        # Bitmaps of cards by number of colors
+        self.color_count_bitmaps = self.build_value_bitmaps(array('B', (bin(mask).count('1') for mask in self.colors)))
+
+    # Filters, every method returns a bitmap of matching cards
+
+    def filter_colors(self, colors, mode: str = CardQuery.COLORS_ANY, identity: bool = False) -> int:
+        """
+        Match cards by their colors or color identity. Uses the modes of cv_core.query.CardQuery.colors.
+        :param colors: Iterable of color shorthands ('U'). 'C' stands for colorless cards.
+        :param mode: One of the CardQuery.COLORS_* modes
+        :param identity: Filter by color identity instead of colors
+        """
+        bitmaps = self.identity_bitmaps if identity else self.color_bitmaps
+        colors = set(colors)
+        colorless = 'C' in colors
+        selected = [self.color_bits[color] for color in colors if color in self.color_bits]
+        none = self.all & ~self.union(bitmaps.values())
+        if mode == CardQuery.COLORS_ANY:
+            result = self.union(bitmaps[bit] for bit in selected)
+            return result | none if colorless else result
+        if mode == CardQuery.COLORS_ALL:
+            return self.intersection([bitmaps[bit] for bit in selected] or [none if colorless else self.all])
+        others = self.union(bitmap for bit, bitmap in bitmaps.items() if bit not in selected)
+        if mode == CardQuery.COLORS_AT_MOST:
+            return self.all & ~others
+        if mode == CardQuery.COLORS_EXACT:
+            if not selected:
+                return none if colorless else self.all
+            return self.intersection(bitmaps[bit] for bit in selected) & ~others
+        raise ValueError('Unknown color filter mode "{}"'.format(mode))
+
+    def filter_color_count(self, min_count: int = 0, max_count: int = 5) -> int:
+        """Match cards with a number of colors in the given range"""
+        return self.union(bitmap for count, bitmap in self.color_count_bitmaps.items()
+                          if min_count <= count <= max_count)
+
+    def filter_types(self, *types) -> int:
+        """Match cards that have all of the given card types"""
+        return self.intersection(self.type_bitmaps.get(self.type_bits.get(card_type), 0) for card_type in types)
+
+    def filter_rarity(self, *rarities) -> int:
+        """Match cards with one of the given rarities (case insensitive)"""
+        return self.union(self.rarity_bitmaps.get(self.rarity_codes.get(rarity.lower()), 0) for rarity in rarities)
+
+    # Results
+
+    def select(self, bitmap: int, card_ids=None) -> list:
+        """
+        Get the multiverse ids of the cards in a bitmap
+        :param bitmap: Bitmap of card positions
+        :param card_ids: (Optional) only check these cards and keep their order, otherwise all cards in name order
+        :return: List of multiverse ids
+        """
+        data = bitmap.to_bytes((len(self.ids) + 7) // 8, 'little')
+        if card_ids is not None:
+            positions = self.positions
+            return [card_id for card_id in card_ids
+                    if card_id in positions and data[positions[card_id] >> 3] >> (positions[card_id] & 7) & 1]
+        return [self.ids[index * 8 + bit] for index, byte in enumerate(data) if byte
+                for bit in range(8) if byte >> bit & 1]
+
+    # Helpers
+
+    def union(self, bitmaps) -> int:
+        """Bitmap of cards contained in any of the bitmaps"""
+        result = 0
+        for bitmap in bitmaps:
+            result |= bitmap
+        return result
+
+    def intersection(self, bitmaps) -> int:
+        """Bitmap of cards contained in all of the bitmaps"""
+        result = self.all
+        for bitmap in bitmaps:
+            result &= bitmap
+        return result
+
+    @staticmethod
+    def build_bitmaps(masks: array, bits) -> dict:
+        """Build one bitmap per bit from an array of per card masks"""
+        data = {bit: bytearray((len(masks) + 7) // 8) for bit in bits}
+        for position, mask in enumerate(masks):
+            if not mask:
+                continue
+            for bit, bitmap in data.items():
+                if mask & bit:
+                    bitmap[position >> 3] |= 1 << (position & 7)
+        return {bit: int.from_bytes(bitmap, 'little') for bit, bitmap in data.items()}
+
+    @staticmethod
+    def build_value_bitmaps(values: array) -> dict:
+        """Build one bitmap per distinct value of an array"""
+        data = {}
+        for position, value in enumerate(values):
+            data.setdefault(value, bytearray((len(values) + 7) // 8))[position >> 3] |= 1 << (position & 7)
+        return {value: int.from_bytes(bitmap, 'little') for value, bitmap in data.items()}
+
+    @classmethod
+    def symbol_mask(cls, text: str) -> int:
+        """Color mask of all colored mana symbols in a text like '{2}{W/U}{G}'"""
+        mask = 0
+        if not text:
+            return mask
+        for symbol in cls.symbol_pattern.findall(text):
+            for part in symbol.split('/'):
+                mask |= cls.color_bits.get(part, 0)
+        return mask
@@ -1,10 +1,55 @@
 import pprint
 
+class _NotLoaded:
+    """ Marker for card attributes that have not been loaded from the database yet """
+    def __repr__(self):
+        return 'NOT_LOADED'
+
+
+NOT_LOADED = _NotLoaded()
+
+
+def _detail_property(name):
+    """ Create a property for a lazily loaded card attribute stored in the slot '_<name>' """
+    slot = '_' + name
+
+    def getter(self):
+        if getattr(self, slot) is NOT_LOADED:
+            self.load_details()
+        return getattr(self, slot)
+
+    def setter(self, value):
+        setattr(self, slot, value)
+
+    return property(getter, setter)
+
+
 class Card:
     """
     Model for an MTG card
+    Rarely shown details (see detail_attributes) can be loaded on first access by passing a details_loader.
     """
-    def __init__(self, card_dict={}):
+    # Lazy attributes and the keys they are read from in card_dict
+    detail_attributes = {'flavor': 'flavor', 'rulings': 'rulings', 'legalities': 'legalities',
+                         'foreign_names': 'foreign_names'}
+
+    __slots__ = ('name', 'layout', 'mana_cost', 'cmc', 'colors', 'color_identity', 'names', 'type', 'supertypes',
+                 'subtypes', 'types', 'rarity', 'text', 'artist', 'number', 'power', 'toughness', 'loyalty',
+                 'multiverse_id', 'variations', 'watermark', 'border', 'timeshifted', 'hand', 'life', 'release_date',
+                 'starter', 'printings', 'original_text', 'original_type', 'source', 'image_url', 'set', 'set_name',
+                 'id', '_flavor', '_rulings', '_legalities', '_foreign_names', 'details_loader')
+
+    flavor = _detail_property('flavor')
+    rulings = _detail_property('rulings')
+    legalities = _detail_property('legalities')
+    foreign_names = _detail_property('foreign_names')
+
+    def __init__(self, card_dict={}, details_loader=None):
+        """
+        :param card_dict: Card data in mtgjson format
+        :param details_loader: (Optional) callable that sets the detail attributes of a card. If given, detail
+        attributes missing from card_dict are loaded on first access.
+        """
         self.name = card_dict.get('name')
         self.layout = card_dict.get('layout')
         self.mana_cost = card_dict.get('manaCost')
@@ -18,7 +63,6 @@ class Card:
         self.types = card_dict.get('types')
         self.rarity = card_dict.get('rarity')
         self.text = card_dict.get('text')
-        self.flavor = card_dict.get('flavor')
         self.artist = card_dict.get('artist')
         self.number = card_dict.get('number')
         self.power = card_dict.get('power')
@@ -41,9 +85,22 @@ class Card:
         self.set = card_dict.get('set')
         self.set_name = card_dict.get('setName')
         self.id = card_dict.get('id')
-        self.legalities = card_dict.get('legalities')
-        self.rulings = card_dict.get('rulings')
-        self.foreign_names = card_dict.get('foreign_names')
+        self.details_loader = details_loader
+        for attribute, key in self.detail_attributes.items():
+            if details_loader and key not in card_dict:
+                setattr(self, attribute, NOT_LOADED)
+            else:
+                setattr(self, attribute, card_dict.get(key))
+
+    def load_details(self):
+        """ Load all detail attributes that have not been loaded yet """
+        loader, self.details_loader = self.details_loader, None
+        if loader:
+            loader(self)
+        # Attributes the loader did not provide are empty
+        for attribute in self.detail_attributes:
+            if getattr(self, '_' + attribute) is NOT_LOADED:
+                setattr(self, attribute, None)
 
 
 class Set:
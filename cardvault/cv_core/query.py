@@ -0,0 +1,186 @@
+from cv_core.util import MTGConstants
+
+
+class CardQuery:
+    """
+    Builder for filtered card searches.
+    Filters are compiled into one sql statement on the cards table. Attributes stored in the card_* side tables are
+    checked with correlated EXISTS sub queries, which use the multiverseid indexes of these tables.
+    All filter methods return the query object so calls can be chained:
+        CardQuery().name('elf').types('Creature').colors(['G'], mode='exact').cmc(max_value=2)
+    """
+    # Modes for color filters
+    COLORS_ANY = 'any'
+    COLORS_ALL = 'all'
+    COLORS_EXACT = 'exact'
+    COLORS_AT_MOST = 'at_most'
+
+    def __init__(self):
+        self.conditions = []
+        self.parameters = []
+
+    def name(self, term: str, prefix: bool = True):
+        """
+        Match cards whose name contains all words of the term
+        :param term: Search string as entered by the user, ignored if empty
+        :param prefix: Also match words that start with the entered words
+        """
+        fts_query = self.fts_query(term, prefix=prefix, columns=('name',))
+        if fts_query:
+            self.conditions.append('c.multiverseid IN (SELECT multiverseid FROM cards_fts WHERE cards_fts MATCH ?)')
+            self.parameters.append(fts_query)
+        return self
+
+    def types(self, *types):
+        """Match cards that have all of the given card types"""
+        return self._side_table_all('card_types', 'type', types)
+
+    def subtypes(self, *subtypes):
+        """Match cards that have all of the given sub types"""
+        return self._side_table_all('card_subtypes', 'subtype', subtypes)
+
+    def supertypes(self, *supertypes):
+        """Match cards that have all of the given super types"""
+        return self._side_table_all('card_supertypes', 'supertype', supertypes)
+
+    def colors(self, colors, mode: str = COLORS_ANY):
+        """
+        Match cards by their colors
+        :param colors: Iterable of color names ('Blue') or shorthands ('U'). 'C' stands for colorless cards.
+        :param mode: COLORS_ANY: card has at least one of the colors
+                     COLORS_ALL: card has all of the colors
+                     COLORS_EXACT: card has exactly these colors
+                     COLORS_AT_MOST: card has no other colors (colorless cards included)
+        """
+        shorthands = {short: color for color, short in MTGConstants.color_shorthands.items()}
+        colors = set(colors)
+        colorless = 'C' in colors
+        names = sorted(shorthands.get(color, color) for color in colors if color != 'C')
+        if not names and not colorless:
+            return self
+        has_color = 'EXISTS (SELECT 1 FROM card_colors cc WHERE cc.multiverseid = c.multiverseid AND cc.color {})'
+        has_none = 'NOT EXISTS (SELECT 1 FROM card_colors cc WHERE cc.multiverseid = c.multiverseid)'
+        in_list = 'IN ({})'.format(', '.join('?' * len(names)))
+        if mode == self.COLORS_ANY:
+            alternatives = []
+            if names:
+                alternatives.append(has_color.format(in_list))
+                self.parameters.extend(names)
+            if colorless:
+                alternatives.append(has_none)
+            self.conditions.append('(' + ' OR '.join(alternatives) + ')')
+        elif mode in (self.COLORS_ALL, self.COLORS_EXACT):
+            for name in names:
+                self.conditions.append(has_color.format('= ?'))
+                self.parameters.append(name)
+            if mode == self.COLORS_EXACT:
+                self.conditions.append('NOT ' + has_color.format('NOT ' + in_list))
+                self.parameters.extend(names)
+            if colorless and not names:
+                self.conditions.append(has_none)
+        elif mode == self.COLORS_AT_MOST:
+            self.conditions.append('NOT ' + has_color.format('NOT ' + in_list))
+            self.parameters.extend(names)
+        else:
+            raise ValueError('Unknown color filter mode "{}"'.format(mode))
+        return self
+
+    def rarity(self, *rarities):
+        """Match cards with one of the given rarities (case insensitive)"""
+        return self._column_in('rarity', [rarity.lower() for rarity in rarities if rarity], 'lower(c.rarity)')
+
+    def sets(self, *set_codes):
+        """Match cards printed in one of the given sets"""
+        return self._column_in('set', [code for code in set_codes if code])
+
+    def cmc(self, min_value=None, max_value=None):
+        """Match cards with a converted mana cost in the given range"""
+        return self._range('c.cmc', min_value, max_value)
+
+    def power(self, min_value=None, max_value=None):
+        """Match cards with a numeric power in the given range"""
+        return self._range("CAST(c.power AS INTEGER)", min_value, max_value, "c.power GLOB '[0-9]*'")
+
+    def toughness(self, min_value=None, max_value=None):
+        """Match cards with a numeric toughness in the given range"""
+        return self._range("CAST(c.toughness AS INTEGER)", min_value, max_value, "c.toughness GLOB '[0-9]*'")
+
+    def build(self, limit: int = None) -> tuple:
+        """
+        Compile the query
+        :param limit: (Optional) maximum number of results
+        :return: Tuple of the sql string and its parameters. The query selects the multiverse ids of all matching
+        cards ordered by name.
+        """
+        from_clause, parameters = self.build_from(limit)
+        return 'SELECT c.multiverseid FROM ' + from_clause, parameters
+
+    def build_from(self, limit: int = None) -> tuple:
+        """
+        Compile the query without its select list, e.g. for CardvaultDB.card_list_query
+        :param limit: (Optional) maximum number of results
+        :return: Tuple of the FROM clause on the cards table aliased as 'c' including the WHERE, ORDER BY and LIMIT
+        clauses and its parameters
+        """
+        sql = 'cards c'
+        if self.conditions:
+            sql += ' WHERE ' + ' AND '.join(self.conditions)
+        sql += ' ORDER BY c.name'
+        parameters = list(self.parameters)
+        if limit is not None:
+            sql += ' LIMIT ?'
+            parameters.append(limit)
+        return sql, parameters
+
+    @staticmethod
+    def fts_query(term: str, prefix: bool = True, phrase: bool = False, columns: tuple = ()) -> str:
+        """
+        Build an FTS5 query from user input. Every word must match.
+        :param term: Search string as entered by the user
+        :param prefix: Match words starting with the entered words
+        :param phrase: Match the words in the entered order only
+        :param columns: (Optional) restrict the search to these columns of cards_fts
+        :return: FTS5 query string, empty if the term contains no words
+        """
+        words = term.split()
+        if not words:
+            return ''
+        # Quote the input so FTS5 operators typed by the user are matched literally
+        strings = [' '.join(words)] if phrase else words
+        strings = ['"{}"'.format(string.replace('"', '""')) for string in strings]
+        query = ' '.join(string + '*' if prefix else string for string in strings)
+        if columns:
+            query = '{{{}}}: ({})'.format(' '.join(columns), query)
+        return query
+
+    def _side_table_all(self, table: str, column: str, values):
+        """Add a condition for every value that has to be present in a side table"""
+        for value in values:
+            if not value:
+                continue
+            self.conditions.append('EXISTS (SELECT 1 FROM {0} s WHERE s.multiverseid = c.multiverseid AND '
+                                   's.{1} = ?)'.format(table, column))
+            self.parameters.append(value)
+        return self
+
+    def _column_in(self, column: str, values: list, expression: str = None):
+        """Add a condition matching a column of the cards table against a list of values"""
+        if values:
+            expression = expression or 'c.`{}`'.format(column)
+            self.conditions.append('{} IN ({})'.format(expression, ', '.join('?' * len(values))))
+            self.parameters.extend(values)
+        return self
+
+    def _range(self, expression: str, min_value, max_value, guard: str = None):
+        """Add conditions limiting an expression to a range"""
+        if min_value is None and max_value is None:
+            return self
+        if guard:
+            self.conditions.append(guard)
+        if min_value is not None:
+            self.conditions.append('{} >= ?'.format(expression))
+            self.parameters.append(min_value)
+        if max_value is not None:
+            self.conditions.append('{} <= ?'.format(expression))
+            self.parameters.append(max_value)
+        return self
@@ -0,0 +1,210 @@
+import queue
+import re
+import threading
+import time
+import unicodedata
+
+from cv_core.card_cache import CardCache
+from cv_core.database import CardvaultDB
+from cv_core.query import CardQuery
+from cv_core.util import CoreConfig
+
+
+class IncrementalSearch:
+    """
+    Search cards by name while the user is typing.
+    The ids and names of all matches are kept between calls. When a search term extends the previous one, the kept
+    matches are narrowed down in memory instead of querying the database again.
+    Searches run in a worker thread with their own database connection, so the loaded cards are kept in a CardCache of
+    the search instead of the one of the engine.
+    """
+    # Maximum number of card objects kept between searches
+    card_cache_size = 1000
+
+    def __init__(self, database: CardvaultDB, limit: int = None):
+        """
+        :param database: Database to search in
+        :param limit: (Optional) maximum number of returned cards, defaults to CoreConfig.search_result_limit
+        """
+        self.database = database
+        self.limit = limit or CoreConfig.search_result_limit
+        # Words of the last search and its matches as (multiverse id, name, name tokens) tuples
+        self.last_words = None
+        self.candidates = []
+        self.cards = CardCache(database, self.card_cache_size)
+        # Duration of the last search in milliseconds
+        self.last_duration = 0.0
+
+    def search(self, term: str) -> list:
+        """
+        Search cards whose name contains words starting with each word of the term
+        :param term: Search string as entered by the user
+        :return: List of cv_core.models.Card objects, names starting with the term first
+        """
+        start = time.perf_counter()
+        # Split the term like the names so narrowing down and a new query find the same cards
+        words = self.tokenize(term)
+        if not words:
+            # Nothing to narrow down, show the first cards of the database
+            self.reset()
+            cards = self.database.card_search_fulltext('', self.limit)
+            self.last_duration = (time.perf_counter() - start) * 1000
+            return cards
+        if self.last_words is not None and self.tokens_match(words, self.last_words):
+            # Every word of the last search starts a word of the new term, so the new matches are a subset of the old
+            self.candidates = [c for c in self.candidates if self.tokens_match(c[2], words)]
+        else:
+            query = CardQuery.fts_query(' '.join(words), columns=('name',))
+            self.candidates = [(card_id, name, self.tokenize(name))
+                               for card_id, name in self.database.card_names_fulltext(query)]
+        self.last_words = words
+        cards = self.load_cards(self.rank(words))
+        self.last_duration = (time.perf_counter() - start) * 1000
+        return cards
+
+    def reset(self):
+        """Forget the kept matches, for example after the card data has changed"""
+        self.last_words = None
+        self.candidates = []
+        self.cards.clear()
+
+    def rank(self, words: tuple) -> list:
+        """
+        Pick the ids of the best candidates. Names starting with the term come first, then alphabetical order.
+        :param words: Words of the search term, see tokenize
+        :return: List of at most self.limit multiverse ids
+        """
+        first, rest = [], []
+        for card_id, name, tokens in self.candidates:
+            if ' '.join(tokens).startswith(' '.join(words)):
+                first.append(card_id)
+                if len(first) == self.limit:
+                    break
+            elif len(rest) < self.limit:
+                rest.append(card_id)
+        return (first + rest)[:self.limit]
+
+    def load_cards(self, card_ids: list) -> list:
+        """
+        Return card objects for ids, only cards not loaded by previous searches are fetched from the database
+        :param card_ids: List of multiverse ids
+        :return: List of cv_core.models.Card objects
+        """
+        return self.cards.get_many(card_ids)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lower case text without diacritics, similar to the unicode61 tokenizer of the full text index"""
+        decomposed = unicodedata.normalize('NFKD', text.lower())
+        return ''.join(char for char in decomposed if not unicodedata.combining(char)).lstrip()
+
+    @staticmethod
+    def tokenize(name: str) -> tuple:
+        """Split a card name into normalized words"""
+        return tuple(re.findall(r'\w+', IncrementalSearch.normalize(name or '')))
+
+    @staticmethod
+    def tokens_match(tokens: tuple, words: tuple) -> bool:
+        """Check if every search word is the beginning of a word in the name"""
+        return all(any(token.startswith(word) for token in tokens) for word in words)
+
+
+class SearchWorker:
+    """
+    Run incremental searches in a background thread.
+    Requests are debounced: a search only starts when no newer term was submitted during the debounce interval.
+    Results of superseded searches are discarded.
+    """
+    def __init__(self, db_file: str, debounce: float = None):
+        """
+        :param db_file: Path of the database file. The worker opens its own connection.
+        :param debounce: (Optional) seconds to wait for further input, defaults to CoreConfig.search_debounce
+        """
+        self.db_file = db_file
+        self.debounce = CoreConfig.search_debounce if debounce is None else debounce
+        self.requests = queue.Queue()
+        # Number of the most recent request, results of older requests are dropped
+        self.generation = 0
+        self.lock = threading.Lock()
+        # Database of the worker thread, set while a search is running
+        self.running = None
+        # Set when the card data changed, the kept matches are dropped before the next search
+        self.reset_pending = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, term: str, callback):
+        """
+        Queue a search. Any search submitted before is superseded.
+        :param term: Search string
+        :param callback: Called from the worker thread with the term, the list of found cards and the exception if the
+        search failed (None otherwise)
+        :return: Generation number of the request
+        """
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+            self.interrupt()
+        self.requests.put((generation, term, callback))
+        return generation
+
+    def cancel(self):
+        """Discard all pending and running searches"""
+        with self.lock:
+            self.generation += 1
+            self.interrupt()
+
+    def reset(self):
+        """Drop the matches and cards kept between searches, e.g. after the card data has changed"""
+        with self.lock:
+            self.reset_pending = True
+
+    def interrupt(self):
+        """Abort the database query of a running search"""
+        if self.running:
+            self.running.connection.interrupt()
+
+    def is_current(self, generation: int) -> bool:
+        """Check if no other search was submitted after the given request"""
+        return generation == self.generation
+
+    def run(self):
+        """Worker loop, errors are reported to the callback and never end the thread"""
+        # The database is opened on the first request so a failure can be reported like any other error
+        search = None
+        while True:
+            generation, term, callback = self.requests.get()
+            # Wait for further input and skip to the newest request
+            time.sleep(self.debounce)
+            while not self.requests.empty():
+                generation, term, callback = self.requests.get()
+            error = None
+            try:
+                if search is None:
+                    search = IncrementalSearch(CardvaultDB(self.db_file))
+                with self.lock:
+                    if not self.is_current(generation):
+                        continue
+                    if self.reset_pending:
+                        # The search objects belong to the worker thread, so they are only reset here
+                        search.reset()
+                        self.reset_pending = False
+                    self.running = search.database
+                cards = search.search(term)
+            except Exception as ex:
+                # Matches of an interrupted or failed search are incomplete
+                if search:
+                    search.reset()
+                if not self.is_current(generation):
+                    # Interrupted by a newer search
+                    continue
+                print('Error while searching for "{0}"\n{1}'.format(term, ex))
+                cards, error = [], ex
+            finally:
+                with self.lock:
+                    self.running = None
+            if self.is_current(generation):
+                try:
+                    callback(term, cards, error)
+                except Exception as ex:
+                    print('Error in search callback\n{}'.format(ex))
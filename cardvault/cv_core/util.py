@@ -15,6 +15,14 @@ class CoreConfig:
     log_level = 0
     # Name of the database file
     db_file = 'cardvault.db'
+    # Number of cards written to the database per batch during bulk inserts
+    insert_batch_size = 5000
+    # Seconds to wait for further input before a search as you type is executed
+    search_debounce = 0.15
+    # Maximum number of results returned by searches
+    search_result_limit = 50
+    # Maximum number of card objects kept in the shared card cache of the engine
+    card_cache_size = 5000
     # Default path to store temporary files
     cache_path = os.path.join(os.path.expanduser('~'), '.cache', 'cardvault')
     # Icon cache path
@@ -75,12 +83,104 @@ class CoreUtilities:
         """
         output = []
         for data in json_data.values():
-            cards = []
-            for raw in data["cards"]:
-                c = Card(raw)
-                c.image_url = MTGConstants.card_image_url_base.format(c.multiverse_id)
-                c.set = data["code"]
-                c.set_name = data["name"]
-                cards.append(c)
-            output = output + cards
+            output.extend(CoreUtilities.parse_mtgjson_set(data))
         return output
+
+    @staticmethod
+    def parse_mtgjson_set(set_data) -> list:
+        """ Convert the cards of a single mtgjson set to card objects
+        :param set_data: Decoded json object of one set
+        :return: List of cv_core.models.Card objects
+        """
+        cards = []
+        for raw in set_data["cards"]:
+            c = Card(raw)
+            c.image_url = MTGConstants.card_image_url_base.format(c.multiverse_id)
+            c.set = set_data["code"]
+            c.set_name = set_data["name"]
+            cards.append(c)
+        return cards
+
+    @staticmethod
+    def iter_mtgjson_sets(file_path, chunk_size=1 << 20):
+        """ Read an mtgjson AllSets file one set at a time.
+        Only the raw text of the set currently being decoded is kept in memory.
+        :param file_path: Path of the AllSets json file
+        :param chunk_size: Number of characters read from the file at once
+        :return: Generator of (set code, decoded set object) tuples
+        """
+        decoder = json.JSONDecoder()
+        with open(file_path, 'r', encoding='utf-8') as file:
+            buffer = ''
+            pos = 0
+            eof = False
+
+            def fill(min_size):
+                """Drop consumed text and read until the buffer holds at least min_size unread characters"""
+                nonlocal buffer, pos, eof
+                buffer = buffer[pos:]
+                pos = 0
+                while not eof and len(buffer) < min_size:
+                    data = file.read(max(chunk_size, min_size - len(buffer)))
+                    if not data:
+                        eof = True
+                    buffer += data
+
+            def next_token():
+                """Skip whitespace and return the next character without consuming it"""
+                nonlocal pos
+                while True:
+                    while pos < len(buffer) and buffer[pos].isspace():
+                        pos += 1
+                    if pos < len(buffer):
+                        return buffer[pos]
+                    if eof:
+                        raise ValueError('Unexpected end of mtgjson file')
+                    fill(1)
+
+            def decode_value(expected_type):
+                """Decode the next json value, reading more of the file until it is complete"""
+                nonlocal pos
+                next_token()
+                while True:
+                    try:
+                        value, end = decoder.raw_decode(buffer, pos)
+                    except json.JSONDecodeError:
+                        if eof:
+                            raise
+                        # Value is cut off at the end of the buffer, at least double the unread text
+                        fill(2 * (len(buffer) - pos))
+                        continue
+                    if not isinstance(value, expected_type):
+                        raise ValueError('Unexpected value in mtgjson file at offset {}'.format(pos))
+                    pos = end
+                    return value
+
+            fill(chunk_size)
+            if next_token() != '{':
+                raise ValueError('mtgjson file does not contain a json object')
+            pos += 1
+            if next_token() == '}':
+                return
+            while True:
+                code = decode_value(str)
+                if next_token() != ':':
+                    raise ValueError('Malformed mtgjson file at offset {}'.format(pos))
+                pos += 1
+                yield code, decode_value(dict)
+                token = next_token()
+                pos += 1
+                if token == '}':
+                    return
+                if token != ',':
+                    raise ValueError('Malformed mtgjson file at offset {}'.format(pos))
+
+    @staticmethod
+    def iter_mtgjson_cards(file_path):
+        """ Stream card objects from an mtgjson AllSets file.
+        Memory usage is bounded by the size of the largest set.
+        :param file_path: Path of the AllSets json file
+        :return: Generator yielding one list of cv_core.models.Card objects per set
+        """
+        for _, set_data in CoreUtilities.iter_mtgjson_sets(file_path):
+            yield CoreUtilities.parse_mtgjson_set(set_data)
@@ -0,0 +1,178 @@
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk, GObject
+
+
+class LazyCardModel(GObject.Object, Gtk.TreeModel, Gtk.TreeSortable):
+    """
+    Flat tree model backed by a list of card ids.
+    Cards are loaded in pages and row values are built only when GTK requests them for visible rows, so the memory
+    used by the model depends on the size of the viewport instead of the number of cards.
+    Sorting reorders the card ids with a sorter callable, the cards are not loaded for that.
+    """
+    # Number of cards loaded at once
+    page_size = 100
+    # Maximum number of loaded pages and built rows kept in memory
+    max_pages = 10
+    max_rows = 1000
+
+    def __init__(self, card_ids, card_loader, row_builder, column_types, sorter=None):
+        """
+        :param card_ids: List of multiverse ids in display order
+        :param card_loader: Callable returning a list of cv_core.models.Card objects for a list of ids
+        :param row_builder: Callable returning the list of column values for a card
+        :param column_types: GType of every column
+        :param sorter: (Optional) callable taking the card ids, a sort column id and a Gtk.SortType and returning the
+        sorted ids, or None if the column can not be sorted
+        """
+        GObject.Object.__init__(self)
+        self.card_ids = list(card_ids)
+        self.card_loader = card_loader
+        self.row_builder = row_builder
+        self.column_types = list(column_types)
+        self.sorter = sorter
+        self.sort_column_id = Gtk.TREE_SORTABLE_UNSORTED_SORT_COLUMN_ID
+        self.sort_order = Gtk.SortType.ASCENDING
+        self.pages = {}
+        self.rows = {}
+
+    def get_card(self, index: int):
+        """
+        Get the card of a row, loading its page if needed
+        :param index: Row number
+        :return: A cv_core.models.Card object or None if it could not be loaded
+        """
+        page = index // self.page_size
+        if page not in self.pages:
+            if len(self.pages) >= self.max_pages:
+                self.pages.clear()
+            page_ids = self.card_ids[page * self.page_size:(page + 1) * self.page_size]
+            self.pages[page] = {card.multiverse_id: card for card in self.card_loader(page_ids)}
+        return self.pages[page].get(self.card_ids[index])
+
+    def get_row(self, index: int) -> list:
+        """ Get the column values of a row """
+        try:
+            return self.rows[index]
+        except KeyError:
+            pass
+        if len(self.rows) >= self.max_rows:
+            self.rows.clear()
+        card = self.get_card(index)
+        if card:
+            row = self.row_builder(card)
+        else:
+            row = [self.card_ids[index]] + [None] * (len(self.column_types) - 1)
+        self.rows[index] = row
+        return row
+
+    def create_iter(self, index: int):
+        """ Create a tree iter for a row. The index is stored off by one because user data of 0 reads as None. """
+        tree_iter = Gtk.TreeIter()
+        tree_iter.user_data = index + 1
+        return tree_iter
+
+    @staticmethod
+    def get_index(tree_iter) -> int:
+        return tree_iter.user_data - 1
+
+    def sort(self, sort_column_id, order):
+        """
+        Reorder the rows by a column
+        :param sort_column_id: Column to sort by
+        :param order: Gtk.SortType
+        :return: True if the rows were sorted
+        """
+        if not self.sorter or sort_column_id < 0:
+            return False
+        card_ids = self.sorter(self.card_ids, sort_column_id, order)
+        if card_ids is None or len(card_ids) != len(self.card_ids):
+            return False
+        positions = {card_id: index for index, card_id in enumerate(self.card_ids)}
+        new_order = [positions[card_id] for card_id in card_ids]
+        self.card_ids = list(card_ids)
+        # Loaded pages and rows are stored by position
+        self.pages.clear()
+        self.rows.clear()
+        if new_order:
+            self.rows_reordered(Gtk.TreePath(), None, new_order)
+        return True
+
+    # Gtk.TreeSortable interface
+
+    def do_get_sort_column_id(self):
+        sorted_by_column = self.sort_column_id >= 0
+        return sorted_by_column, self.sort_column_id, self.sort_order
+
+    def do_set_sort_column_id(self, sort_column_id, order):
+        if self.sort(sort_column_id, order):
+            self.sort_column_id = sort_column_id
+            self.sort_order = order
+            self.sort_column_changed()
+
+    def do_set_sort_func(self, sort_column_id, sort_func, *user_data):
+        # Sorting is done by the sorter, custom compare functions are not supported
+        pass
+
+    def do_set_default_sort_func(self, sort_func, *user_data):
+        pass
+
+    def do_has_default_sort_func(self):
+        return False
+
+    # Gtk.TreeModel interface
+
+    def do_get_flags(self):
+        # Iters point to positions, so they do not persist when the rows are sorted
+        return Gtk.TreeModelFlags.LIST_ONLY
+
+    def do_get_n_columns(self):
+        return len(self.column_types)
+
+    def do_get_column_type(self, column):
+        return self.column_types[column]
+
+    def do_get_iter(self, path):
+        indices = path.get_indices()
+        if len(indices) == 1 and 0 <= indices[0] < len(self.card_ids):
+            return True, self.create_iter(indices[0])
+        return False, None
+
+    def do_get_path(self, tree_iter):
+        return Gtk.TreePath((self.get_index(tree_iter),))
+
+    def do_get_value(self, tree_iter, column):
+        return self.get_row(self.get_index(tree_iter))[column]
+
+    def do_iter_next(self, tree_iter):
+        index = self.get_index(tree_iter) + 1
+        if index < len(self.card_ids):
+            tree_iter.user_data = index + 1
+            return True, tree_iter
+        return False, None
+
+    def do_iter_previous(self, tree_iter):
+        index = self.get_index(tree_iter) - 1
+        if index >= 0:
+            tree_iter.user_data = index + 1
+            return True, tree_iter
+        return False, None
+
+    def do_iter_children(self, parent):
+        if parent is None and self.card_ids:
+            return True, self.create_iter(0)
+        return False, None
+
+    def do_iter_has_child(self, tree_iter):
+        return False
+
+    def do_iter_n_children(self, tree_iter):
+        return len(self.card_ids) if tree_iter is None else 0
+
+    def do_iter_nth_child(self, parent, n):
+        if parent is None and 0 <= n < len(self.card_ids):
+            return True, self.create_iter(n)
+        return False, None
+
+    def do_iter_parent(self, child):
+        return False, None
@@ -1,19 +1,34 @@
+import re
+import time
+
 import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk
 
+from cv_gtk3.card_model import LazyCardModel
 from cv_gtk3.gtk_util import GTKUtilities
 from cv_core.util import MTGConstants
 
 
 class CardView(Gtk.ScrolledWindow):
     """ Class for displaying a list of cards in an GTKTreeView """
+    # Lists with more cards are shown through a LazyCardModel
+    lazy_threshold = 1000
+    # Sort rank of every rarity, unknown rarities are sorted first
+    rarity_ranks = {rarity: rank for rank, rarity in enumerate(MTGConstants.rarities)}
+    # Sort orders of the sortable columns (see cardtree.glade) for lists shown through a LazyCardModel
+    sort_attributes = {1: 'name', 3: 'types', 10: 'set_name', 13: 'rarity', 14: 'color', 15: 'number'}
+
     def __init__(self, filtered):
         """ Constructor for a card list display
         :param filtered: Should the card list be filterable
         """
         self.filtered = filtered
         self.cards = []
+        # Rows per second of the last update of the list store
+        self.update_rate = 0.0
+        # Optional callable receiving the number of rows and the duration in seconds of every list store update
+        self.timing_hook = None
         # Call constructor of superclass
         super(CardView, self).__init__()
         self.set_hexpand(True)
@@ -23,7 +38,8 @@ class CardView(Gtk.ScrolledWindow):
         self.ui.add_from_string(GTKUtilities.load_ui_resource('cardtree.glade'))
         self.tree = self.ui.get_object('cardTree')
         self.store = self.ui.get_object('cardStore')
-        self.store.set_sort_func(4, self.compare_rarity, None)
+        self.sorted_model = self.ui.get_object('cardStoreFilteredSorted')
+        self.column_types = [self.store.get_column_type(i) for i in range(self.store.get_n_columns())]
         # Add the TreeView
         self.add(self.tree)
         #self.tree.connect("row-activated", self.on_row_double_click)
@@ -33,6 +49,9 @@ class CardView(Gtk.ScrolledWindow):
         :return: List od card objects
         """
         (model, path_list) = self.ui.get_object("cardTree").get_selection().get_selected_rows()
+        if isinstance(model, LazyCardModel):
+            cards = [model.get_card(path.get_indices()[0]) for path in path_list]
+            return [card for card in cards if card]
         selected_ids = []
         for path in path_list:
             tree_iter = model.get_iter(path)
@@ -44,53 +63,142 @@ class CardView(Gtk.ScrolledWindow):
         :param card_list:
         """
         self.cards = card_list
-        self.ui.get_object("cardStore").clear()
-        # Disable update if tree is filtered (performance)
-        if self.filtered:
-            self.tree.freeze_child_notify()
-        # Fill list with new cards
+        if len(card_list) > self.lazy_threshold:
+            # Only build rows for visible cards
+            cards = {card.multiverse_id: card for card in card_list if card.multiverse_id is not None}
+            self.update_ids(list(cards.keys()), lambda card_ids: [cards[card_id] for card_id in card_ids],
+                            lambda card_ids, attribute, descending:
+                            self.sort_cards(cards, card_ids, attribute, descending))
+            return
+        start = time.perf_counter()
+        # Detach the models from the tree and remember the sorting chosen by the user
+        sort_column_id, sort_order = self.get_sort_column_id()
+        self.tree.set_model(None)
+        # Fill a new store that no filter or sort model is listening to, so rows are not sorted one by one
+        store = Gtk.ListStore(*self.column_types)
         for card in card_list:
             if card.multiverse_id is None: continue
-            # TODO load row color base on card status (owned, wanted,...)
-            color = 'black'
-            mana_cost = None
-            if not card.types.__contains__('Land'):
-                mana_cost = GTKUtilities.get_mana_icons(card.mana_cost)
-            item = [card.multiverse_id,
-                    card.name,
-                    ' '.join(card.supertypes or ''),
-                    ' '.join(card.types or ''),
-                    card.rarity,
-                    card.power,
-                    card.toughness,
-                    ', '.join(card.printings or ''),
-                    mana_cost,
-                    card.cmc,
-                    card.set_name,
-                    color,
-                    card.original_text]
-            self.store.append(item)
-        # Reactivate update for filtered trees
-        if self.filtered:
-            self.tree.thaw_child_notify()
+            store.append(self.card_to_row(card))
+        # Build the filter and sort models on top of the filled store, sort once and reattach
+        self.store = store
+        self.sorted_model = Gtk.TreeModelSort.new_with_model(store.filter_new())
+        if sort_column_id is not None:
+            self.sorted_model.set_sort_column_id(sort_column_id, sort_order)
+        self.tree.set_model(self.sorted_model)
+        self.report_update_time(len(store), time.perf_counter() - start)
 
-    @staticmethod
-    def compare_rarity(model, row1, row2, _):
-        """ Compare function for two the rarities of two cards
-        :param model: The tree view model
-        :param row1: The first row to compare
-        :param row2: The second row to compare
-        :param _: ignored
-        :return: Integer value based on comparison
+    def report_update_time(self, row_count, duration):
+        """ Record the speed of a list store update and pass it to the timing hook
+        :param row_count: Number of rows in the store
+        :param duration: Duration of the update in seconds
+        """
+        self.update_rate = row_count / duration if duration else 0.0
+        if self.timing_hook:
+            self.timing_hook(row_count, duration)
+
+    def update_ids(self, card_ids, card_loader, sorter=None):
+        """ Show a list of cards that are only loaded when their rows become visible
+        :param card_ids: List of multiverse ids in display order
+        :param card_loader: Callable returning card objects for a list of multiverse ids
+        :param sorter: (Optional) callable taking a list of multiverse ids, a sort order (see sort_attributes) and a
+        descending flag, returning the sorted ids (e.g. CardvaultEngine.sort_card_ids)
+        """
+        sort_column_id, sort_order = self.get_sort_column_id()
+        self.store.clear()
+
+        def sort_ids(ids, column, order):
+            if column not in self.sort_attributes:
+                return None
+            return sorter(ids, self.sort_attributes[column], order == Gtk.SortType.DESCENDING)
+
+        model = LazyCardModel(card_ids, card_loader, self.card_to_row, self.column_types, sort_ids if sorter else None)
+        if sort_column_id is not None:
+            # Sort before the model is attached so the tree does not follow the reordering row by row
+            model.set_sort_column_id(sort_column_id, sort_order)
+        self.tree.set_model(model)
+
+    def get_sort_column_id(self):
+        """ Get the sorting chosen by the user
+        :return: Tuple of sort column id and Gtk.SortType, (None, None) if the view is unsorted
         """
-        sort_column = 4
-        value1 = model.get_value(row1, sort_column)
-        value2 = model.get_value(row2, sort_column)
-        if MTGConstants.rarities[value1.lower()] < MTGConstants.rarities[value2.lower()]:
-            return -1
-        elif value1 == value2:
-            return 0
+        model = self.tree.get_model()
+        if not isinstance(model, Gtk.TreeSortable):
+            model = self.sorted_model
+        return model.get_sort_column_id()
+
+    @classmethod
+    def sort_cards(cls, cards, card_ids, attribute, descending):
+        """ Sort card ids by the values of loaded cards
+        :param cards: Dict of multiverse ids and card objects
+        :param card_ids: List of multiverse ids
+        :param attribute: Sort order, see sort_attributes
+        :param descending: Sort in descending order
+        :return: List of the sorted ids
+        """
+        if attribute == 'rarity':
+            key = lambda card: cls.rarity_ranks.get((card.rarity or '').lower(), -1)
+        elif attribute == 'color':
+            key = cls.color_order
+        elif attribute == 'types':
+            key = lambda card: ' '.join(card.types or '')
+        elif attribute == 'number':
+            key = cls.collector_number
         else:
-            return 1
+            key = lambda card: getattr(card, attribute) or ''
+        return sorted(card_ids, key=lambda card_id: key(cards[card_id]), reverse=descending)
 
+    @classmethod
+    def card_to_row(cls, card) -> list:
+        """ Build the values of a card row
+        :param card: A cv_core.models.Card object
+        :return: List of column values
+        """
+        # TODO load row color base on card status (owned, wanted,...)
+        color = 'black'
+        mana_cost = None
+        if 'Land' not in (card.types or ()):
+            mana_cost = GTKUtilities.get_mana_icons(card.mana_cost)
+        return [card.multiverse_id,
+                card.name,
+                ' '.join(card.supertypes or ''),
+                ' '.join(card.types or ''),
+                card.rarity,
+                card.power,
+                card.toughness,
+                ', '.join(card.printings or ''),
+                mana_cost,
+                int(card.cmc or 0),
+                card.set_name,
+                color,
+                card.original_text,
+                # Hidden sort keys, GTK sorts integer columns natively
+                cls.rarity_ranks.get((card.rarity or '').lower(), -1),
+                cls.color_order(card),
+                cls.collector_number(card),
+                None if card.number is None else str(card.number)]
 
+    @staticmethod
+    def color_order(card) -> int:
+        """ Sort key for cards by color (WUBRG, multicolor, colorless), then by converted mana cost
+        :param card: A cv_core.models.Card object
+        :return: Integer sort key
+        """
+        colors = card.colors or ()
+        if len(colors) == 1 and colors[0] in MTGConstants.color_shorthands:
+            group = MTGConstants.mana_order.index(MTGConstants.color_shorthands[colors[0]])
+        elif colors:
+            group = len(MTGConstants.mana_order)
+        else:
+            group = len(MTGConstants.mana_order) + 1
+        return group * 1000 + min(int(card.cmc or 0), 999)
+
+    @staticmethod
+    def collector_number(card) -> int:
+        """ Sort key for the collector number of a card, e.g. '12b' sorts after '12a' and before '13'
+        :param card: A cv_core.models.Card object
+        :return: Integer sort key
+        """
+        match = re.match(r'(\d*)([a-z]?)', str(card.number or '').lower())
+        number = int(match.group(1)) if match.group(1) else 0
+        suffix = ord(match.group(2)) - ord('a') + 1 if match.group(2) else 0
+        return number * 100 + suffix
@@ -1,3 +1,4 @@
+import argparse
 import os
 
 import gi
@@ -11,43 +12,76 @@ from cv_gtk3.main_window import MainWindowFunctions
 from cv_gtk3.setting import GUISettings
 from cv_gtk3.signal_handlers import handlers
 from cv_gtk3.gtk_util import GTKUtilities
+from cv_gtk3.startup_trace import StartupTracer
 
 
 class CardvaultGTK(MainWindowFunctions):
     """ Main UI class for the GTK interface """
     def __init__(self):
         # Start engine (without config file)
-        self.engine = engine.CardvaultEngine()
-        # Load Glade files
-        glade_files = ['mainwindow.glade', 'search.glade', 'overlays.glade']
-        self.ui = Gtk.Builder()
-        for file in glade_files:
-            self.ui.add_from_string(GTKUtilities.load_ui_resource(file))
-        # Set pages for the ui to use
-        GUISettings.pages = {
-            "search": self.ui.get_object("searchView"),
-        }
-        # Verify that cache directories exist
-        if not os.path.isdir(util.CoreConfig.cache_path):
-            os.mkdir(util.CoreConfig.cache_path)
-        if not os.path.isdir(util.CoreConfig.icon_cache_path):
-            os.mkdir(util.CoreConfig.icon_cache_path)
-        # Load single mana icons
-        GTKUtilities.mana_icons = GTKUtilities.load_icon_cache(os.path.join(GTKUtilities.resources_path, 'mana'))
-        # Load the the pre constructed icon cache
-        GTKUtilities.precon_icon_cache = GTKUtilities.load_icon_cache(util.CoreConfig.icon_cache_path)
+        with StartupTracer.phase('database'):
+            self.engine = engine.CardvaultEngine()
         # Call constructor of superclasses
-        MainWindowFunctions.__init__(self, self.ui)
+        MainWindowFunctions.__init__(self, Gtk.Builder())
+        # Load the main window, pages are loaded when they are first shown
+        with StartupTracer.phase('glade'):
+            self.load_ui_files(['mainwindow.glade'])
+        # Verify that cache directories exist
+        with StartupTracer.phase('icon cache'):
+            if not os.path.isdir(util.CoreConfig.cache_path):
+                os.mkdir(util.CoreConfig.cache_path)
+            if not os.path.isdir(util.CoreConfig.icon_cache_path):
+                os.mkdir(util.CoreConfig.icon_cache_path)
+            # Mana icons and the icon atlas are loaded on first use
         # Create Signal handlers and connect them to the UI
-        self.handlers = handlers.Handlers(self)
-        self.ui.connect_signals(self.handlers)
+        with StartupTracer.phase('signal handlers'):
+            self.handlers = handlers.Handlers(self)
+            self.ui.connect_signals(self.handlers)
         # Initialize starting view
-        self.ui.get_object('mainWindow').show_all()
-        self.hide_initial_widgets()
-        self.switch_page('search')
+        window = self.ui.get_object('mainWindow')
+        self.first_draw_handler = window.connect('draw', self.on_first_draw)
+        with StartupTracer.phase('show window'):
+            window.show_all()
+            self.hide_initial_widgets()
+            self.switch_page('search')
+
+    def on_first_draw(self, window, cairo_context):
+        """ Finish the startup trace once the main window is painted and start preparing icons and filters """
+        window.disconnect(self.first_draw_handler)
+        StartupTracer.mark('first paint')
+        StartupTracer.finish()
+        if GUISettings.icon_warm_up_count > 0:
+            GTKUtilities.warm_up_mana_icons(self.engine.get_common_mana_costs(GUISettings.icon_warm_up_count))
+        # Mana filter toggles only use the in-memory index, build it while the user looks at the window
+        self.engine.prepare_filter_index()
+        return False
+
+    def page_built(self, page):
+        """ Set up the handlers of a page and connect its signals """
+        self.handlers.init_page(page)
+        self.ui.connect_signals(self.handlers)
+
+
+def rebuild_icon_atlas():
+    """ Pack all cached mana cost icons into the icon atlas """
+    os.makedirs(util.CoreConfig.icon_cache_path, exist_ok=True)
+    count = GTKUtilities.rebuild_icon_atlas(include_files=True)
+    print('Icon atlas rebuilt with {} icons'.format(count))
 
 
 def main():
+    parser = argparse.ArgumentParser(prog='cardvault')
+    parser.add_argument('--rebuild-icon-atlas', action='store_true',
+                        help='pack all cached mana cost icons into the icon atlas and exit')
+    parser.add_argument('--trace-startup', nargs='?', const='', metavar='REPORT_FILE',
+                        help='record the time spent in each startup phase and write a report')
+    args = parser.parse_args()
+    StartupTracer.enable_from_environment()
+    if args.trace_startup is not None:
+        StartupTracer.enable(args.trace_startup)
+    if args.rebuild_icon_atlas:
+        rebuild_icon_atlas()
+        return
     CardvaultGTK()
     Gtk.main()
 
@@ -1,25 +1,44 @@
+import itertools
 import os
+import queue
 import re
+import threading
 
-from gi.repository import GdkPixbuf
-from zipfile import ZipFile
-
-try:
-    from PIL import Image
-except ImportError as err:
-    print('PIL imaging library is not installed')
+from gi.repository import GdkPixbuf, GLib
 
 from cv_core.util import CoreConfig
+from cv_gtk3.icon_atlas import IconAtlas
+from cv_gtk3.resource_loader import ResourceLoader
 
 
 class GTKUtilities:
     """ Access to image caches and utilities for use in the GTK application """
-    # Loaded mana symbols Format: {'B': GDKPixbuf, '3': GDKPixbuf}
+    # Loaded mana symbols, read on first use Format: {'B': GDKPixbuf, '3': GDKPixbuf}
     mana_icons = {}
-    # Cache for combined mana cost icons
-    precon_icon_cache = {}
+    # Mana symbols scaled down to display size, created on first use
+    scaled_mana_icons = {}
+    # Persistent cache for combined mana cost icons (cv_gtk3.icon_atlas.IconAtlas), opened on first use
+    icon_atlas = None
+    # File name of the icon atlas in the icon cache directory
+    icon_atlas_file = 'mana.atlas'
+    # Seconds without new icons before they are written to the icon atlas
+    icon_save_delay = 2
+    # Combined mana cost icons in display size, keyed by icon name ('3_U_B')
+    mana_icon_cache = {}
+    # Factor by which mana symbols are scaled down for display
+    mana_icon_scale = 5
+    # Icons waiting to be written to the icon cache directory
+    icon_save_queue = None
+    # Number of mana cost icons created per main loop iteration while warming up the icon cache
+    icon_warm_up_batch = 10
     # Path of Gtk resources relative to cardvault base package
     resources_path = os.path.join('cv_gtk3', 'resources')
+    # Access to the resource files (cv_gtk3.resource_loader.ResourceLoader), created on first use
+    resource_loader = None
+    # Extract the resources to the cache directory when running from a zip archive
+    extract_resources = True
+    # Content of loaded Glade files by file name
+    ui_resources = {}
 
     @staticmethod
     def get_path_from_base_dir(*dirs):
@@ -29,63 +48,184 @@ class GTKUtilities:
     def get_mana_icons(mana_string):
         """ Return the combined mana symbols for a mana string
         :param mana_string: String in the format '{3}{U}{B}'
-        :return: GdkPixbuf containing the combined symbols
+        :return: GdkPixbuf containing the combined symbols in display size
         """
         if not mana_string:
             return
         icon_list = re.findall("{(.*?)}", mana_string.replace("/", "-"))
         icon_name = "_".join(icon_list)
         try:
-            icon = GTKUtilities.precon_icon_cache[icon_name]
+            return GTKUtilities.mana_icon_cache[icon_name]
         except KeyError:
-            icon = GTKUtilities.create_mana_icons(mana_string)
-            GTKUtilities.precon_icon_cache[icon_name] = icon
-        # Scale icon for display
-        if icon:
-            icon = icon.scale_simple(icon.get_width() / 5, icon.get_height() / 5, GdkPixbuf.InterpType.HYPER)
+            pass
+        icon_atlas = GTKUtilities.get_icon_atlas()
+        icon = icon_atlas.get(icon_name)
+        if not icon:
+            icon = GTKUtilities.create_mana_icons(icon_list)
+            if icon:
+                GTKUtilities.save_icon_async(icon_name, icon)
+        GTKUtilities.mana_icon_cache[icon_name] = icon
         return icon
 
     @staticmethod
-    def create_mana_icons(mana_string):
-        # Convert the string to a List
-        glyphs = re.findall("{(.*?)}", mana_string)
-        if len(glyphs) == 0:
+    def get_scaled_mana_icon(glyph):
+        """ Return a single mana symbol in display size
+        :param glyph: Name of the mana symbol ('U', 'W-U')
+        :return: GdkPixbuf with alpha channel or None if the symbol is not loaded
+        """
+        try:
+            return GTKUtilities.scaled_mana_icons[glyph]
+        except KeyError:
+            pass
+        icon = GTKUtilities.get_mana_glyph(glyph)
+        if not icon:
             return
-        # Compute horizontal size for the final image
-        size = len(glyphs) * 105
-        image = Image.new("RGBA", (size, 105))
-        for index, icon in enumerate(glyphs):
-            x_pos = index * 105
-            try:
-                # Try loading mana icon and converting to PIL.Image for combining
-                loaded = GTKUtilities.pixbuf_to_image(GTKUtilities.mana_icons[icon])
-            except KeyError:
-                print('Mana icon "{}" is not loaded.'.format(icon))
-                return
-            image.paste(loaded, (x_pos, 0))
-        # Save pre build icon file
-        path = os.path.join(CoreConfig.icon_cache_path, "_".join(glyphs) + ".png")
-        image.save(path)
+        icon = icon.scale_simple(icon.get_width() / GTKUtilities.mana_icon_scale,
+                                 icon.get_height() / GTKUtilities.mana_icon_scale,
+                                 GdkPixbuf.InterpType.HYPER)
+        if not icon.get_has_alpha():
+            icon = icon.add_alpha(False, 0, 0, 0)
+        GTKUtilities.scaled_mana_icons[glyph] = icon
+        return icon
+
+    @staticmethod
+    def get_mana_glyph(glyph):
+        """ Return a single mana symbol in full size, the symbol is loaded from the resources on first use
+        :param glyph: Name of the mana symbol ('U', 'W-U')
+        :return: GdkPixbuf or None if there is no such symbol
+        """
         try:
-            pixbuf = GdkPixbuf.Pixbuf.new_from_file(path)
+            return GTKUtilities.mana_icons[glyph]
+        except KeyError:
+            pass
+        resource_path = os.path.join(GTKUtilities.resources_path, 'mana', glyph + '.png')
+        try:
+            icon = GTKUtilities.load_pixbuf_resource(resource_path)
         except Exception as ex:
-            print(ex)
+            print('Mana icon "{0}" could not be loaded\n{1}'.format(glyph, ex))
+            icon = None
+        # Also remember missing symbols so they are not looked up again
+        GTKUtilities.mana_icons[glyph] = icon
+        return icon
+
+    @staticmethod
+    def warm_up_mana_icons(mana_strings):
+        """ Create the icons of mana costs in the background, a few at a time while the main loop is idle
+        :param mana_strings: Iterable of mana strings in the format '{3}{U}{B}'
+        """
+        pending = iter(mana_strings)
+
+        def warm_up_batch():
+            batch = list(itertools.islice(pending, GTKUtilities.icon_warm_up_batch))
+            for mana_string in batch:
+                GTKUtilities.get_mana_icons(mana_string)
+            # Keep the idle handler installed until all mana strings are done
+            return len(batch) == GTKUtilities.icon_warm_up_batch
+
+        GLib.idle_add(warm_up_batch, priority=GLib.PRIORITY_LOW)
+
+    @staticmethod
+    def create_mana_icons(glyphs):
+        """ Combine mana symbols into one icon in memory
+        :param glyphs: List of mana symbol names
+        :return: GdkPixbuf in display size or None if a symbol is missing
+        """
+        if len(glyphs) == 0:
+            return
+        icons = [GTKUtilities.get_scaled_mana_icon(glyph) for glyph in glyphs]
+        if None in icons:
             return
+        width = sum(icon.get_width() for icon in icons)
+        height = max(icon.get_height() for icon in icons)
+        pixbuf = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, width, height)
+        # Start with a transparent image
+        pixbuf.fill(0)
+        x_pos = 0
+        for icon in icons:
+            icon.copy_area(0, 0, icon.get_width(), icon.get_height(), pixbuf, x_pos, 0)
+            x_pos += icon.get_width()
         return pixbuf
 
     @staticmethod
-    def pixbuf_to_image(pix):
-        """Convert gdkpixbuf to PIL image"""
-        data = pix.get_pixels()
-        w = pix.props.width
-        h = pix.props.height
-        stride = pix.props.rowstride
-        mode = "RGB"
-        if pix.props.has_alpha:
-            mode = "RGBA"
-        im = Image.frombytes(mode, (w, h), data, "raw", mode, stride)
+    def save_icon_async(icon_name, pixbuf):
+        """ Add a combined mana icon to the icon atlas in a background thread
+        :param icon_name: Name of the icon ('3_U_B')
+        :param pixbuf: GdkPixbuf to save
+        """
+        if not GTKUtilities.icon_save_queue:
+            GTKUtilities.icon_save_queue = queue.Queue()
+            thread = threading.Thread(target=GTKUtilities.icon_save_worker, args=(GTKUtilities.icon_save_queue,))
+            thread.daemon = True
+            thread.start()
+        GTKUtilities.icon_save_queue.put((icon_name, pixbuf))
 
-        return im
+    @staticmethod
+    def icon_save_worker(save_queue):
+        """ Worker thread collecting new icons and writing them to the icon atlas once no more icons arrive
+        :param save_queue: Queue of (icon name, GdkPixbuf) tuples
+        """
+        pending = {}
+        while True:
+            try:
+                icon_name, pixbuf = save_queue.get(timeout=GTKUtilities.icon_save_delay if pending else None)
+                pending[icon_name] = pixbuf
+                continue
+            except queue.Empty:
+                pass
+            try:
+                GTKUtilities.rebuild_icon_atlas(pending)
+            except Exception as ex:
+                print('Error while saving icon atlas\n{}'.format(ex))
+            pending = {}
+
+    @staticmethod
+    def get_icon_atlas():
+        """ Return the icon atlas, it is opened on first use
+        :return: cv_gtk3.icon_atlas.IconAtlas
+        """
+        if GTKUtilities.icon_atlas is None:
+            GTKUtilities.load_icon_atlas()
+        return GTKUtilities.icon_atlas
+
+    @staticmethod
+    def load_icon_atlas():
+        """ Open the icon atlas in the icon cache directory """
+        GTKUtilities.icon_atlas = IconAtlas(os.path.join(CoreConfig.icon_cache_path, GTKUtilities.icon_atlas_file))
+
+    @staticmethod
+    def rebuild_icon_atlas(new_icons=None, include_files=False):
+        """ Write the icon atlas with its current content and additional icons
+        :param new_icons: (Optional) dict with icon names and GdkPixbuf objects to add
+        :param include_files: Also add the single icon files found in the icon cache directory
+        :return: Number of icons in the new atlas
+        """
+        icon_atlas = GTKUtilities.get_icon_atlas()
+        icons = icon_atlas.icons()
+        if include_files:
+            for icon_name, icon in GTKUtilities.load_icon_cache_file(CoreConfig.icon_cache_path).items():
+                glyph = GTKUtilities.get_mana_glyph(icon_name.split('_')[0])
+                if glyph and icon.get_height() >= glyph.get_height():
+                    # Icons of older versions were cached in the full size of the mana symbols
+                    icon = icon.scale_simple(icon.get_width() / GTKUtilities.mana_icon_scale,
+                                             icon.get_height() / GTKUtilities.mana_icon_scale,
+                                             GdkPixbuf.InterpType.HYPER)
+                icons.setdefault(icon_name, icon)
+        icons.update(new_icons or {})
+        path = os.path.join(CoreConfig.icon_cache_path, GTKUtilities.icon_atlas_file)
+        IconAtlas.write(path, icons)
+        GTKUtilities.icon_atlas = IconAtlas(path)
+        return len(GTKUtilities.icon_atlas)
+
+    @staticmethod
+    def get_resource_loader():
+        """ Return the loader for resource files, it is created on first use
+        :return: cv_gtk3.resource_loader.ResourceLoader
+        """
+        if GTKUtilities.resource_loader is None:
+            cache_path = os.path.join(CoreConfig.cache_path, 'resources') if GTKUtilities.extract_resources else None
+            GTKUtilities.resource_loader = ResourceLoader.from_package(GTKUtilities.get_path_from_base_dir(),
+                                                                       GTKUtilities.resources_path, cache_path)
+        return GTKUtilities.resource_loader
 
     @staticmethod
     def load_ui_resource(resource_name):
@@ -93,32 +233,37 @@ class GTKUtilities:
         :param resource_name: Name of the glade file
         :return: String content of the resource file
         """
-        if os.path.isdir(os.path.dirname(__file__)):
-            return GTKUtilities.load_ui_resource_file(os.path.join(GTKUtilities.resources_path, 'gui',  resource_name))
-        else:
-            zip_path = os.path.dirname(os.path.dirname(__file__))
-            return GTKUtilities.load_ui_resource_zip(zip_path,
-                                                     os.path.join(GTKUtilities.resources_path, 'gui',  resource_name))
+        try:
+            return GTKUtilities.ui_resources[resource_name]
+        except KeyError:
+            pass
+        resource_path = os.path.join(GTKUtilities.resources_path, 'gui', resource_name)
+        content = GTKUtilities.get_resource_loader().read(resource_path).decode('utf-8')
+        GTKUtilities.ui_resources[resource_name] = content
+        return content
 
     @staticmethod
-    def load_ui_resource_file(resource_path):
-        """ LOad GUI resource from file path
+    def load_pixbuf_resource(resource_path):
+        """ Load an image resource depending on the execution mode (from a directory or from a zip file)
         :param resource_path: Relative path of the resource based on the cardvault base package
-        :return: String content of the resource file
+        :return: GdkPixbuf object
         """
-        full_path = GTKUtilities.get_path_from_base_dir(resource_path)
-        with open(full_path, 'r') as file:
-            return file.read()
+        loader = GTKUtilities.get_resource_loader()
+        file_path = loader.path(resource_path)
+        if file_path:
+            return GdkPixbuf.Pixbuf.new_from_file(file_path)
+        return GTKUtilities.load_pixbuf_data(loader.read(resource_path))
 
     @staticmethod
-    def load_ui_resource_zip(archive_file, resource_path):
-        """ Load GUI resource from a zip archive (for usage in release mode)
-        :param archive_file: Full path of the archive file
-        :param resource_path: Path of the resources within the archive
-        :return: String representation of the file content
+    def load_pixbuf_data(data):
+        """ Decode image data
+        :param data: Content of an image file as bytes
+        :return: GdkPixbuf object
         """
-        with ZipFile(archive_file, 'r') as archive:
-            return archive.read(resource_path).decode('utf-8')
+        pixbuf_loader = GdkPixbuf.PixbufLoader()
+        pixbuf_loader.write(data)
+        pixbuf_loader.close()
+        return pixbuf_loader.get_pixbuf()
 
     @staticmethod
     def load_icon_cache(icon_path):
@@ -126,11 +271,20 @@ class GTKUtilities:
         :param icon_path: Relative path of icon resource files
         :return: Dict with icon names and Gdkpixbuf objects
         """
-        if os.path.isdir(GTKUtilities.get_path_from_base_dir(icon_path)):
-            return GTKUtilities.load_icon_cache_file(GTKUtilities.get_path_from_base_dir(icon_path))
-        else:
-            zip_path = os.path.dirname(os.path.dirname(__file__))
-            return GTKUtilities.load_icon_cache_zip(zip_path)
+        loader = GTKUtilities.get_resource_loader()
+        if loader.path(icon_path):
+            return GTKUtilities.load_icon_cache_file(loader.path(icon_path))
+        icons = {}
+        for file in loader.list(icon_path):
+            if not file.endswith('.png'):
+                continue
+            try:
+                pixbuf = GTKUtilities.load_pixbuf_data(loader.read(os.path.join(icon_path, file)))
+                # Strip filename extension
+                icons[os.path.splitext(file)[0]] = pixbuf
+            except Exception as ex:
+                print('Error while loading icon file "{0}"\n{1}'.format(file, ex))
+        return icons
 
     @staticmethod
     def load_icon_cache_file(icon_path):
@@ -141,6 +295,8 @@ class GTKUtilities:
         icons = {}
         files = os.listdir(icon_path)
         for file in files:
+            if not file.endswith('.png'):
+                continue
             try:
                 pixbuf = GdkPixbuf.Pixbuf.new_from_file(os.path.join(icon_path, file))
                 # Strip filename extension
@@ -149,28 +305,3 @@ class GTKUtilities:
             except Exception as ex:
                 print('Error while loading icon file "{}"'.format(ex))
         return icons
-
-    @staticmethod
-    def load_icon_cache_zip(zip_path):
-        """ Load icon cache from zipped archive
-        :param zip_path: Full path of the zip archive
-        :return: Dict with icon names and Gdkpixbuf object
-        """
-        with ZipFile(zip_path, 'r') as archive:
-            icon_path = os.path.join('cv_gtk3', 'resources', 'mana')
-            files = [path for path in archive.namelist() if os.path.isfile(path.startswith(icon_path))]
-            icons = {}
-            for file in files:
-                with archive.open(file) as data:
-                    try:
-                        loader = GdkPixbuf.PixbufLoader()
-                        loader.write(data.read())
-                        pixbuf = loader.get_pixbuf()
-                        loader.close()
-                        # Strip filename extension
-                        icon_name = os.path.splitext(file)[0]
-                        icons[icon_name] = pixbuf
-                    except Exception as ex:
-                        print('Error while loading icon file "{0}"\n{1}'.format(file, ex))
-            return icons
-
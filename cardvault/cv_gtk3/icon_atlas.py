@@ -0,0 +1,103 @@
+import json
+import mmap
+import os
+import struct
+
+from gi.repository import GdkPixbuf, GLib
+
+
+class IconAtlas:
+    """
+    Persistent cache of icons packed into a single file.
+    The file holds an index and one RGBA image in which all icons are stacked vertically. The image is memory mapped
+    and an icon is only turned into a pixbuf when it is requested, so opening the atlas does not depend on the number
+    of icons it contains.
+    File layout: magic bytes, length of the index (uint32), json index, raw pixel data
+    """
+    magic = b'CVATLAS1'
+
+    def __init__(self, path):
+        """
+        :param path: Path of the atlas file, a missing or invalid file results in an empty atlas
+        """
+        self.path = path
+        # Icon positions in the image: {name: [y, width, height]}
+        self.index = {}
+        # Width of the atlas image in pixels
+        self.width = 0
+        self.data = None
+        self.data_offset = 0
+        if os.path.isfile(path):
+            try:
+                self.open()
+            except (OSError, ValueError) as ex:
+                print('Error while loading icon atlas "{0}"\n{1}'.format(path, ex))
+                self.index = {}
+
+    def open(self):
+        """ Read the index and map the image data of the atlas file """
+        with open(self.path, 'rb') as file:
+            if file.read(len(self.magic)) != self.magic:
+                raise ValueError('Not an icon atlas file')
+            index_length = struct.unpack('<I', file.read(4))[0]
+            header = json.loads(file.read(index_length).decode('utf-8'))
+            self.width = header['width']
+            self.index = header['icons']
+            self.data_offset = len(self.magic) + 4 + index_length
+            if self.index:
+                self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, name):
+        """ Slice an icon out of the atlas image
+        :param name: Name of the icon
+        :return: GdkPixbuf or None if the atlas does not contain the icon
+        """
+        try:
+            y_pos, width, height = self.index[name]
+        except KeyError:
+            return
+        stride = self.width * 4
+        start = self.data_offset + y_pos * stride
+        pixels = GLib.Bytes.new(self.data[start:start + height * stride])
+        return GdkPixbuf.Pixbuf.new_from_bytes(pixels, GdkPixbuf.Colorspace.RGB, True, 8, width, height, stride)
+
+    def icons(self):
+        """ Get all icons of the atlas
+        :return: Dict with icon names and GdkPixbuf objects
+        """
+        return {name: self.get(name) for name in self.index}
+
+    @classmethod
+    def write(cls, path, icons):
+        """ Pack icons into a new atlas file. The file is replaced atomically.
+        :param path: Path of the atlas file
+        :param icons: Dict with icon names and GdkPixbuf objects
+        """
+        icons = {name: icon if icon.get_has_alpha() else icon.add_alpha(False, 0, 0, 0)
+                 for name, icon in icons.items() if icon}
+        width = max((icon.get_width() for icon in icons.values()), default=0)
+        stride = width * 4
+        index = {}
+        image = bytearray()
+        for name, icon in sorted(icons.items()):
+            index[name] = [len(image) // stride, icon.get_width(), icon.get_height()]
+            pixels = icon.get_pixels()
+            row_length = icon.get_width() * 4
+            padding = bytes(stride - row_length)
+            for row in range(icon.get_height()):
+                start = row * icon.get_rowstride()
+                image += pixels[start:start + row_length] + padding
+        header = json.dumps({'width': width, 'icons': index}).encode('utf-8')
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(cls.magic)
+            file.write(struct.pack('<I', len(header)))
+            file.write(header)
+            file.write(image)
+        os.replace(temp_path, path)
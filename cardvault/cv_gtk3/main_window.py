@@ -1,4 +1,6 @@
+from cv_gtk3.gtk_util import GTKUtilities
 from cv_gtk3.setting import GUISettings
+from cv_gtk3.startup_trace import StartupTracer
 
 
 class MainWindowFunctions:
@@ -8,6 +10,8 @@ class MainWindowFunctions:
     """
     def __init__(self, ui):
         self.ui = ui
+        # Glade files already added to the builder
+        self.loaded_ui_files = set()
 
     def hide_initial_widgets(self):
         self.ui.get_object('statusbar_spinner').set_visible(False)
@@ -37,7 +41,7 @@ class MainWindowFunctions:
         :param page: name of the new page
         """
         container = self.ui.get_object("contentPage")
-        new_page = GUISettings.pages[page]
+        new_page = self.get_page(page)
         if GUISettings.current_page:
             container.remove(GUISettings.current_page)
         GUISettings.current_page = new_page
@@ -45,4 +49,45 @@ class MainWindowFunctions:
         container.show_all()
         GUISettings.current_page.emit('show')
         app_title = GUISettings.current_page.get_name() + " - " +GUISettings.application_title
-        self.ui.get_object("mainWindow").set_title(app_title)
\ No newline at end of file
+        self.ui.get_object("mainWindow").set_title(app_title)
+
+    def get_page(self, page):
+        """
+        Return the widget of a page, the page is built on first use
+        :param page: name of the page
+        :return: Top level widget of the page
+        """
+        try:
+            return GUISettings.pages[page]
+        except KeyError:
+            return self.build_page(page)
+
+    def build_page(self, page):
+        """
+        Load the Glade files of a page and register it in GUISettings.pages
+        :param page: name of the page
+        :return: Top level widget of the page
+        """
+        definition = GUISettings.page_definitions[page]
+        with StartupTracer.phase('page ' + page):
+            self.load_ui_files(definition['files'])
+            GUISettings.pages[page] = self.ui.get_object(definition['widget'])
+            self.page_built(page)
+        return GUISettings.pages[page]
+
+    def load_ui_files(self, ui_files):
+        """
+        Add Glade files to the builder, files that are already loaded are skipped
+        :param ui_files: List of Glade file names
+        """
+        for file in ui_files:
+            if file not in self.loaded_ui_files:
+                self.ui.add_from_string(GTKUtilities.load_ui_resource(file))
+                self.loaded_ui_files.add(file)
+
+    def page_built(self, page):
+        """
+        Called after the widgets of a page were created
+        :param page: name of the page
+        """
+        pass
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import shutil
+from zipfile import ZipFile
+
+
+class ResourceLoader:
+    """
+    Read resource files of the application independent of the execution mode.
+    Running from source the files are read from the package directory. Running from a zipapp archive the archive is
+    opened once and files are looked up in its index, or the resources are extracted to a cache directory on first run
+    so later starts read plain files.
+    All paths are relative to the cardvault base package ('cv_gtk3/resources/gui/search.glade').
+    """
+    def __init__(self, base_path=None, archive=None):
+        """
+        :param base_path: Directory containing the resource files
+        :param archive: Open ZipFile to read the files from if there is no base path
+        """
+        self.base_path = base_path
+        self.archive = archive
+        # Members of the archive: {path: ZipInfo}
+        self.index = {info.filename: info for info in archive.infolist()} if archive else {}
+
+    @classmethod
+    def from_package(cls, package_path, resources_path, cache_path=None):
+        """
+        Create a loader for the cardvault base package
+        :param package_path: Path of the base package, either a directory or a zipapp archive
+        :param resources_path: Relative path of the resources within the package
+        :param cache_path: (Optional) directory to extract the resources of an archive to
+        :return: ResourceLoader
+        """
+        if os.path.isdir(package_path):
+            return cls(package_path)
+        archive = ZipFile(package_path, 'r')
+        if cache_path:
+            try:
+                extracted_path = cls.extract(archive, resources_path, cache_path)
+                archive.close()
+                return cls(extracted_path)
+            except OSError as ex:
+                print('Error while extracting resources to "{0}"\n{1}'.format(cache_path, ex))
+        return cls(archive=archive)
+
+    @staticmethod
+    def extract(archive, resources_path, cache_path):
+        """
+        Extract the resources of an archive to a versioned directory, the files are only extracted once per version.
+        The version is derived from the names and checksums of the files so a new build uses a new directory.
+        :param archive: Open ZipFile
+        :param resources_path: Relative path of the resources within the archive
+        :param cache_path: Directory for extracted resources
+        :return: Directory containing the extracted files with their paths from the archive
+        """
+        prefix = ResourceLoader.archive_name(resources_path) + '/'
+        members = sorted((info for info in archive.infolist() if info.filename.startswith(prefix)),
+                         key=lambda info: info.filename)
+        fingerprint = hashlib.sha1()
+        for info in members:
+            fingerprint.update('{0}:{1}:{2}\n'.format(info.filename, info.CRC, info.file_size).encode('utf-8'))
+        version = fingerprint.hexdigest()[:16]
+        target = os.path.join(cache_path, version)
+        if os.path.isdir(target):
+            return target
+        os.makedirs(cache_path, exist_ok=True)
+        # Extract into a temporary directory first so an interrupted run never leaves a partial version behind
+        temp_path = '{0}.tmp{1}'.format(target, os.getpid())
+        archive.extractall(temp_path, members)
+        try:
+            os.rename(temp_path, target)
+        except OSError:
+            # Another instance extracted the same version in the meantime
+            shutil.rmtree(temp_path, ignore_errors=True)
+            if not os.path.isdir(target):
+                raise
+        # Remove resources of older versions
+        for name in os.listdir(cache_path):
+            if name != version and '.tmp' not in name:
+                shutil.rmtree(os.path.join(cache_path, name), ignore_errors=True)
+        return target
+
+    @staticmethod
+    def archive_name(resource_path):
+        """ Convert a relative path to the name of an archive member """
+        return resource_path.replace(os.sep, '/').strip('/')
+
+    def path(self, resource_path):
+        """
+        Return the path of a resource on the file system
+        :param resource_path: Relative path of the resource
+        :return: Absolute path or None if the resources are read from an archive
+        """
+        if self.base_path:
+            return os.path.join(self.base_path, resource_path)
+
+    def read(self, resource_path):
+        """
+        Read the content of a resource file
+        :param resource_path: Relative path of the resource
+        :return: File content as bytes
+        """
+        if self.base_path:
+            with open(self.path(resource_path), 'rb') as file:
+                return file.read()
+        try:
+            info = self.index[self.archive_name(resource_path)]
+        except KeyError:
+            raise FileNotFoundError('Resource "{}" not found in archive'.format(resource_path))
+        return self.archive.read(info)
+
+    def list(self, resource_dir):
+        """
+        List the files in a resource directory
+        :param resource_dir: Relative path of the directory
+        :return: List of file names
+        """
+        if self.base_path:
+            return os.listdir(self.path(resource_dir))
+        prefix = self.archive_name(resource_dir) + '/'
+        return [name[len(prefix):] for name in self.index
+                if name.startswith(prefix) and '/' not in name[len(prefix):] and len(name) > len(prefix)]
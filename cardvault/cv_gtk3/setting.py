@@ -1,10 +1,16 @@
 class GUISettings:
     """ Settings for the GUI """
-    # Collection of all pages the UI can use
+    # Collection of all pages the UI can use, pages are built the first time they are shown
     pages = {}
+    # Glade files and name of the top level widget for each page, the files are loaded when the page is built
+    page_definitions = {
+        'search': {'files': ['search.glade', 'overlays.glade'], 'widget': 'searchView'},
+    }
     # Currently viewed page
     current_page = ''
     # Title for the GTK window
     application_title = 'Cardvault'
     # Location of Glade UI files
     glade_file_path = ''
+    # Number of the most used mana costs whose icons are prepared after the window is shown (0 to disable)
+    icon_warm_up_count = 100
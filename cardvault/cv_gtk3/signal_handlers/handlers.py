@@ -4,6 +4,11 @@ from cv_gtk3.signal_handlers.search import SearchPageHandlers
 
 class Handlers(MenuBarHandlers, SearchPageHandlers):
     """ Class containing all signal handlers for the GTK GUI """
+    # Handlers of the single pages, initialized when the page is built
+    page_handlers = {
+        'search': SearchPageHandlers,
+    }
+
     def __init__(self, app):
         """ Initialize handler class
         :param app: reference to an CardvaultGTK object
@@ -11,4 +16,9 @@ class Handlers(MenuBarHandlers, SearchPageHandlers):
         self.app = app
         # Call constructors of superclasses
         MenuBarHandlers.__init__(self, self.app)
-        SearchPageHandlers.__init__(self, self.app)
+
+    def init_page(self, page):
+        """ Initialize the handlers of a page after its widgets were created
+        :param page: name of the page
+        """
+        self.page_handlers[page].__init__(self, self.app)
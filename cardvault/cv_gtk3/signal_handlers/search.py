@@ -1,5 +1,9 @@
 import os
 
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import GLib
+
 from cv_gtk3.card_view import CardView
 from cv_gtk3.gtk_util import GTKUtilities
 
@@ -11,6 +15,12 @@ class SearchPageHandlers:
         :param app: Reference to an CardvaultGTK object
         """
         self.app = app
+        # Term of the most recent search, results of older searches are ignored
+        self.search_term = None
+        # Unfiltered results of the most recent search, None while all cards are shown
+        self.search_results = []
+        # Set while filter buttons are reset, the results are refreshed once afterwards
+        self.filters_resetting = False
 
         # Build the card view
         overlay = self.app.ui.get_object("searchResults")
@@ -28,19 +38,90 @@ class SearchPageHandlers:
         :param search_entry: Search entry widget
         """
         search_term = search_entry.get_text()
-        results = self.app.engine.search_by_name(search_term)
-        self.card_list.update(results)
+        if search_term == self.search_term:
+            return
+        self.search_term = search_term
+        if not search_term.strip():
+            # No search term, browse all cards
+            self.app.engine.search_cancel()
+            self.app.clear_status()
+            self.search_results = None
+            self.show_all_cards()
+            return
+        self.app.show_status('Searching for "{}"...'.format(search_term))
+        # Search runs in a worker thread, results are passed back to the GTK main loop
+        self.app.engine.search_by_name_async(
+            search_term, lambda term, results, error: GLib.idle_add(self.search_finished, term, results, error))
+
+    def search_finished(self, search_term, results, error=None):
+        """ Display the results of a finished search
+        :param search_term: The term that was searched for
+        :param results: List of found cards
+        :param error: Exception if the search failed
+        """
+        if search_term != self.search_term:
+            # A newer search was started in the meantime
+            return
+        self.app.clear_status()
+        if error:
+            self.app.ui.get_object("statusbar_label").set_visible(True)
+            self.app.ui.get_object("statusbar_label").set_text('Search for "{}" failed'.format(search_term))
+        self.search_results = results
+        self.card_list.update(self.filter_results(results))
         # Switch Overlay off and set info diaplay
         self.app.ui.get_object("searchOverlay").set_visible(False)
         self.app.ui.get_object("search_title_label").set_visible(True)
         self.app.ui.get_object("search_title").set_text(search_term)
 
-    @staticmethod
-    def do_clear_mana_filter(button_grid):
-        """ Reset filter buttons in mana grid """
-        for button in button_grid.get_children():
-            if hasattr(button, 'set_active'):
+    def show_all_cards(self):
+        """ Display all cards matching the mana filter. Only the ids are loaded, cards are loaded for visible rows. """
+        engine = self.app.engine
+        colors = self.selected_colors()
+        card_ids = engine.filter_card_ids(colors=colors) if colors else engine.get_card_ids()
+        self.card_list.update_ids(card_ids, engine.get_cards, engine.sort_card_ids)
+        self.app.ui.get_object("searchOverlay").set_visible(False)
+        self.app.ui.get_object("search_title_label").set_visible(False)
+        self.app.ui.get_object("search_title").set_text("")
+
+    def do_search_filter_changed(self, *_):
+        """ Apply changed filters to the current search results """
+        if self.filters_resetting:
+            return
+        if self.search_results is None:
+            self.show_all_cards()
+        else:
+            self.card_list.update(self.filter_results(self.search_results))
+
+    def selected_colors(self):
+        """ Get the colors selected in the mana filter
+        :return: List of color shorthands
+        """
+        return [button.get_name() for button in self.app.ui.get_object("manaFilterGrid").get_children()
+                if hasattr(button, 'get_active') and button.get_active()]
+
+    def filter_results(self, cards):
+        """ Filter cards by the colors selected in the mana filter
+        :param cards: List of cards
+        :return: List of cards matching the filter
+        """
+        colors = self.selected_colors()
+        if not colors:
+            return cards
+        return self.app.engine.filter_cards(cards, colors=colors)
+
+    def do_clear_mana_filter(self, button_grid):
+        """ Reset filter buttons in mana grid and refresh the results once """
+        active = [button for button in button_grid.get_children()
+                  if hasattr(button, 'get_active') and button.get_active()]
+        if not active:
+            return
+        self.filters_resetting = True
+        try:
+            for button in active:
                 button.set_active(False)
+        finally:
+            self.filters_resetting = False
+        self.do_search_filter_changed()
 
     @staticmethod
     def do_clear_set_filter(entry, *_):
@@ -49,6 +130,11 @@ class SearchPageHandlers:
 
     def do_search_clear_all_clicked(self, *_):
         """ Rest all controls in search view """
+        self.app.engine.search_cancel()
+        self.app.clear_status()
+        # Do not start a new search for the emptied entry
+        self.search_term = ""
+        self.search_results = []
         self.app.ui.get_object("searchEntry").set_text("")
         self.do_clear_mana_filter(self.app.ui.get_object("manaFilterGrid"))
         self.app.ui.get_object("rarityCombo").set_active(0)
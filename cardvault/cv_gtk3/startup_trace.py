@@ -0,0 +1,95 @@
+import contextlib
+import datetime
+import os
+import time
+
+
+class StartupTracer:
+    """
+    Records the wall time of the startup phases of the GTK interface.
+    Phases are always recorded, the report is only written when tracing is enabled by the CARDVAULT_TRACE_STARTUP
+    environment variable (set to 1 or to the path of the report file) or the --trace-startup flag.
+    This module does not import GTK so it can be loaded first and include the time spent on imports.
+    """
+    # Environment variable to enable tracing
+    env_variable = 'CARDVAULT_TRACE_STARTUP'
+    # Reference time for all phases
+    start_time = time.perf_counter()
+    # Recorded phases as (name, start, duration) tuples in seconds, duration is None for single points in time
+    phases = []
+    # Time from start until the main window is painted in milliseconds we aim to stay below
+    budget_ms = 1500
+    # Write the report when startup is finished
+    enabled = False
+    # Path of the report file
+    report_file = os.path.join(os.path.expanduser('~'), '.cache', 'cardvault', 'startup_trace.txt')
+
+    @staticmethod
+    def enable(report_file=None):
+        """ Write a report when startup is finished
+        :param report_file: (Optional) path of the report file
+        """
+        StartupTracer.enabled = True
+        if report_file:
+            StartupTracer.report_file = report_file
+
+    @staticmethod
+    def enable_from_environment():
+        """ Enable tracing if the environment variable is set """
+        value = os.environ.get(StartupTracer.env_variable, '')
+        if value and value != '0':
+            StartupTracer.enable(None if value == '1' else value)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def phase(name):
+        """ Record the time spent in a with block
+        :param name: Name of the startup phase
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            StartupTracer.phases.append((name, start - StartupTracer.start_time, time.perf_counter() - start))
+
+    @staticmethod
+    def mark(name):
+        """ Record a single point in time
+        :param name: Name of the event
+        """
+        StartupTracer.phases.append((name, StartupTracer.elapsed(), None))
+
+    @staticmethod
+    def elapsed():
+        """ Seconds since the start of the application """
+        return time.perf_counter() - StartupTracer.start_time
+
+    @staticmethod
+    def report():
+        """ Format the recorded phases
+        :return: Report as a string
+        """
+        lines = ['Cardvault startup trace {}'.format(datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))]
+        for name, start, duration in StartupTracer.phases:
+            if duration is None:
+                lines.append('{:<20} at {:>8.1f} ms'.format(name, start * 1000))
+            else:
+                lines.append('{:<20} {:>11.1f} ms  (at {:.1f} ms)'.format(name, duration * 1000, start * 1000))
+        total = StartupTracer.elapsed() * 1000
+        lines.append('{:<20} {:>11.1f} ms  (budget {} ms{})'.format(
+            'total', total, StartupTracer.budget_ms, ', exceeded' if total > StartupTracer.budget_ms else ''))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def finish():
+        """ Print and write the report if tracing is enabled """
+        if not StartupTracer.enabled:
+            return
+        report = StartupTracer.report()
+        print(report)
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(StartupTracer.report_file)), exist_ok=True)
+            with open(StartupTracer.report_file, 'w') as file:
+                file.write(report + '\n')
+        except OSError as ex:
+            print('Error while writing startup trace "{0}"\n{1}'.format(StartupTracer.report_file, ex))